@@ -0,0 +1,227 @@
+'''*-----------------------------------------------------------------------*---
+                                                          Date  : Oct 18 2026
+
+    File Name  : benchmark.py
+    Description: Times each stage of the resolution pipeline on seeded random
+                 scenes and saves the results as JSON, so runs can be
+                 compared across commits.
+
+                 python3 benchmark.py --out bench.json
+---*-----------------------------------------------------------------------*'''
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+import loc_index
+import sonar_processor
+import sonar_profiler
+
+'''----------------------------------------------------------------------------
+Config variables
+----------------------------------------------------------------------------'''
+SCENE_SIZES = [1, 8, 32, 128, 512]
+SEED = 0
+REPEAT = 3
+THRESHOLD = 0.5
+CHECK_CHUNK = 1000          #chunk size checked against whole-ping profiling
+PEAK_WINDOW = 8
+
+'''[gen_scene]-----------------------------------------------------------------
+  Places num_objs objects randomly in the same volume as gen_times.
+----------------------------------------------------------------------------'''
+def gen_scene(num_objs, seed):
+  rng = random.Random(seed)
+  return [[rng.uniform(-50, 50), rng.uniform(0, 100), rng.uniform(-25, 25)]
+          for i in range(num_objs)]
+
+'''[gen_samples]---------------------------------------------------------------
+  Builds a raw ping with a unit pulse at every receiver time.
+----------------------------------------------------------------------------'''
+def gen_samples(times, sample_rate):
+  length = int(math.ceil(max(max(t) for t in times) * sample_rate)) + 16
+  samples = np.zeros((len(times), length))
+
+  for rcvr in range(len(times)):
+    samples[rcvr][np.round(np.array(times[rcvr]) * sample_rate).astype(int)] = 1
+
+  return samples
+
+'''[profile_peaks]-------------------------------------------------------------
+  Profiles samples in chunks of chunk samples, timing peaks at their maxima.
+----------------------------------------------------------------------------'''
+def profile_peaks(samples, sample_rate, chunk):
+  pf = sonar_profiler.sonar_profiler(sample_rate, THRESHOLD, PEAK_WINDOW,
+                                     len(samples), PEAK_WINDOW)
+  peaks = [[] for rcvr in range(len(samples))]
+
+  for start in range(0, samples.shape[1], chunk):
+    for rcvr, found in enumerate(pf.process(samples[:, start:start + chunk])):
+      peaks[rcvr].extend(found)
+  for rcvr, found in enumerate(pf.flush()):
+    peaks[rcvr].extend(found)
+
+  return peaks
+
+'''[check_chunking]------------------------------------------------------------
+  Checks that profiling in chunks finds the same peaks as profiling the
+  whole ping at once.
+
+  [return] - largest difference between peak times, in samples, or inf if
+             the number of peaks differs
+----------------------------------------------------------------------------'''
+def check_chunking(samples, sample_rate, chunk=CHECK_CHUNK):
+  whole = profile_peaks(samples, sample_rate, samples.shape[1])
+  chunked = profile_peaks(samples, sample_rate, chunk)
+
+  error = 0.0
+  for a, b in zip(whole, chunked):
+    if len(a) != len(b):
+      return float('inf')
+    if len(a):
+      error = max(error, float(np.abs(np.array(a) - np.array(b)).max() * sample_rate))
+  return error
+
+'''[measure]-------------------------------------------------------------------
+  Runs fn repeat times and returns the best time, the peak memory allocated
+  during one more traced run, and the result of fn.
+----------------------------------------------------------------------------'''
+def measure(fn, repeat):
+  best = float('inf')
+
+  for i in range(repeat):
+    with contextlib.redirect_stdout(io.StringIO()):
+      start = time.perf_counter()
+      result = fn()
+      best = min(best, time.perf_counter() - start)
+
+  tracemalloc.start()
+  with contextlib.redirect_stdout(io.StringIO()):
+    fn()
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+
+  return best, peak, result
+
+'''[bench_scene]---------------------------------------------------------------
+  Times every pipeline stage on one scene.
+----------------------------------------------------------------------------'''
+def bench_scene(num_objs, seed, repeat):
+  s_p = sonar_processor.sonar_processor()
+  sensors = s_p.sensors
+  scene = gen_scene(num_objs, seed)
+  stages = {}
+
+  def calc():
+    return sensors.calc_times(scene, False)
+
+  def profile():
+    return s_p.profiler(samples, sensors.sample_rate, THRESHOLD)
+
+  def candidates():
+    return sonar_processor.gen_candidates(times, sensors, 1 / sensors.sample_rate)
+
+  def resolve():
+    return sonar_processor.resolve_t_arrays(cand_times, sensors,
+                                            sonar_processor.TOL_INT)
+
+  def dedup():
+    index = loc_index.loc_index(sonar_processor.TOL_OBJ)
+    for loc in locs[success]:
+      index.add(loc)
+    return index
+
+  def spin():
+    s_p.times = [list(t) for t in times]
+    s_p.spin()
+    return s_p.found_locs
+
+  stages['calc_times'] = measure(calc, repeat)
+  times = [list(t) for t in stages['calc_times'][2].T]
+  samples = gen_samples(times, sensors.sample_rate)
+
+  stages['profiler'] = measure(profile, repeat)
+  stages['candidates'] = measure(candidates, repeat)
+  cands, sorted_times = stages['candidates'][2]
+  cand_times = np.column_stack([sorted_times[r][cands[:, r]] for r in range(4)])
+
+  stages['resolve'] = measure(resolve, repeat)
+  success, locs = stages['resolve'][2]
+
+  stages['dedup'] = measure(dedup, repeat)
+  stages['spin'] = measure(spin, repeat)
+
+  ping_time = stages['profiler'][0] + stages['spin'][0]
+
+  return {
+    'objects': num_objs,
+    'seed': seed,
+    'candidates': len(cands),
+    'solved': int(success.sum()),
+    'found': len(stages['spin'][2]),
+    'solves_per_s': len(cands) / stages['resolve'][0] if stages['resolve'][0] else None,
+    'pings_per_s': 1 / ping_time if ping_time else None,
+    'chunk_error': check_chunking(samples, sensors.sample_rate),
+    'stages': {name: {'seconds': best, 'peak_bytes': peak}
+               for name, (best, peak, result) in stages.items()},
+  }
+
+'''[git_rev]-------------------------------------------------------------------
+  Gets the current commit, if run from a git checkout
+----------------------------------------------------------------------------'''
+def git_rev():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                   stderr=subprocess.DEVNULL).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+'''[main]----------------------------------------------------------------------
+  Runs the benchmark on every scene size and saves the results.
+----------------------------------------------------------------------------'''
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--sizes', type=int, nargs='+', default=SCENE_SIZES)
+  parser.add_argument('--seed', type=int, default=SEED)
+  parser.add_argument('--repeat', type=int, default=REPEAT)
+  parser.add_argument('--out', default='benchmark.json')
+  args = parser.parse_args()
+
+  results = {
+    'commit': git_rev(),
+    'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'python': platform.python_version(),
+    'numpy': np.__version__,
+    'scenes': [],
+  }
+
+  for num_objs in args.sizes:
+    scene = bench_scene(num_objs, args.seed, args.repeat)
+    results['scenes'].append(scene)
+
+    print('{0:5d} objs | {1:8d} cands | {2:12.0f} solves/s | {3:8.2f} pings/s'.format(
+          num_objs, scene['candidates'], scene['solves_per_s'] or 0,
+          scene['pings_per_s'] or 0))
+    if scene['chunk_error'] > 1e-6:
+      print('      chunked profiling moved peaks by up to {0} samples'.format(
+            scene['chunk_error']))
+    for name, stage in scene['stages'].items():
+      print('           {0:<11} {1:10.3f} ms {2:10.1f} KiB'.format(
+            name, stage['seconds'] * 1000, stage['peak_bytes'] / 1024))
+
+  with open(args.out, 'w') as f:
+    json.dump(results, f, indent=2)
+
+  print('Saved results to ' + args.out)
+
+if __name__ == '__main__':
+  main()
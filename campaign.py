@@ -0,0 +1,182 @@
+'''*-----------------------------------------------------------------------*---
+                                                          Date  : Oct 18 2026
+
+    File Name  : campaign.py
+    Description: Runs many random scenes through the simulation and resolution
+                 pipeline across worker processes, and aggregates how well
+                 objects are localized.
+
+                 python3 campaign.py --trials 10000 --objects 8 --out runs
+                   runs_trials.csv - one row per trial
+                   runs_hist.csv   - histogram of localization errors
+---*-----------------------------------------------------------------------*'''
+
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import csv
+import io
+import os
+
+import numpy as np
+
+import sonar_processor
+
+'''----------------------------------------------------------------------------
+Config variables
+----------------------------------------------------------------------------'''
+SEED = 0
+TRIALS = 1000
+NUM_OBJECTS = 8
+MATCH_DIST = 2              #furthest a found loc can be from its object, in m
+HIST_BIN = 0.1              #width of error histogram bins, in m
+IN_FLIGHT = 4               #trials queued per worker
+
+TRIAL_FIELDS = ['trial', 'objects', 'found', 'matched', 'false_pos', 'missed',
+                'mean_err', 'max_err']
+
+'''[gen_scene]-----------------------------------------------------------------
+  Places num_objs objects randomly in the same volume as gen_times, using the
+  trial's own random stream so every trial is reproducible on its own.
+----------------------------------------------------------------------------'''
+def gen_scene(trial, seed, num_objs):
+  rng = np.random.default_rng([seed, trial])
+  return rng.uniform([-50, 0, -25], [50, 100, 25], (num_objs, 3))
+
+'''[match_locs]----------------------------------------------------------------
+  Pairs found locations with actual locations, closest pairs first, as long
+  as they are within max_dist.
+
+  [return] - list of (found index, actual index, distance)
+----------------------------------------------------------------------------'''
+def match_locs(found, actual, max_dist):
+  found = np.asarray(found, dtype=float).reshape(-1, 3)
+  actual = np.asarray(actual, dtype=float).reshape(-1, 3)
+
+  dist = np.linalg.norm(found[:, None] - actual[None], axis=2)
+  used_found = set()
+  used_actual = set()
+  pairs = []
+
+  for flat in np.argsort(dist, axis=None):
+    i, j = np.unravel_index(flat, dist.shape)
+    if dist[i][j] > max_dist:
+      break
+    if i in used_found or j in used_actual:
+      continue
+    used_found.add(i)
+    used_actual.add(j)
+    pairs.append((int(i), int(j), float(dist[i][j])))
+
+  return pairs
+
+'''[run_trial]-----------------------------------------------------------------
+  Generates, resolves, and matches one scene.
+
+  [return] - row of TRIAL_FIELDS, list of localization errors
+----------------------------------------------------------------------------'''
+def run_trial(trial, seed, num_objs):
+  s_p = sonar_processor.sonar_processor()
+  scene = gen_scene(trial, seed, num_objs)
+
+  s_p.times = [list(t) for t in s_p.sensors.calc_times(scene, False).T]
+  with contextlib.redirect_stdout(io.StringIO()):
+    s_p.spin()
+
+  pairs = match_locs(s_p.found_locs, scene, MATCH_DIST)
+  errs = [p[2] for p in pairs]
+
+  row = {
+    'trial': trial,
+    'objects': num_objs,
+    'found': len(s_p.found_locs),
+    'matched': len(pairs),
+    'false_pos': len(s_p.found_locs) - len(pairs),
+    'missed': num_objs - len(pairs),
+    'mean_err': float(np.mean(errs)) if errs else '',
+    'max_err': max(errs) if errs else '',
+  }
+  return row, errs
+
+'''[run_trials]----------------------------------------------------------------
+  Yields results of every trial in order, keeping only a few trials per
+  worker in flight so memory stays flat at any trial count.
+----------------------------------------------------------------------------'''
+def run_trials(trials, seed, num_objs, workers):
+  with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+    pending = collections.deque()
+    next_trial = 0
+
+    while next_trial < trials or pending:
+      while next_trial < trials and len(pending) < workers * IN_FLIGHT:
+        pending.append(executor.submit(run_trial, next_trial, seed, num_objs))
+        next_trial += 1
+
+      yield pending.popleft().result()
+
+'''[campaign]------------------------------------------------------------------
+  Runs the trials, streaming one CSV row per trial and accumulating totals
+  and the error histogram.
+
+  [return] - dict of totals and rates, histogram counts
+----------------------------------------------------------------------------'''
+def campaign(trials, seed, num_objs, workers, trial_file):
+  totals = collections.Counter()
+  hist = np.zeros(int(np.ceil(MATCH_DIST / HIST_BIN)) + 1, dtype=np.int64)
+  err_sum = 0.0
+  err_sqr = 0.0
+
+  writer = csv.DictWriter(trial_file, TRIAL_FIELDS)
+  writer.writeheader()
+
+  for row, errs in run_trials(trials, seed, num_objs, workers):
+    writer.writerow(row)
+
+    for key in ('objects', 'found', 'matched', 'false_pos', 'missed'):
+      totals[key] += row[key]
+
+    for err in errs:
+      hist[min(int(err / HIST_BIN), len(hist) - 1)] += 1
+      err_sum += err
+      err_sqr += err * err
+
+  summary = {
+    'trials': trials,
+    'objects': totals['objects'],
+    'found': totals['found'],
+    'matched': totals['matched'],
+    'mean_err': err_sum / totals['matched'] if totals['matched'] else 0,
+    'rms_err': (err_sqr / totals['matched']) ** 0.5 if totals['matched'] else 0,
+    'false_pos_rate': totals['false_pos'] / totals['found'] if totals['found'] else 0,
+    'miss_rate': totals['missed'] / totals['objects'] if totals['objects'] else 0,
+  }
+  return summary, hist
+
+'''[main]----------------------------------------------------------------------
+  Runs a campaign and writes the trial and histogram CSVs.
+----------------------------------------------------------------------------'''
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--trials', type=int, default=TRIALS)
+  parser.add_argument('--objects', type=int, default=NUM_OBJECTS)
+  parser.add_argument('--seed', type=int, default=SEED)
+  parser.add_argument('--workers', type=int, default=os.cpu_count())
+  parser.add_argument('--out', default='campaign')
+  args = parser.parse_args()
+
+  with open(args.out + '_trials.csv', 'w', newline='') as f:
+    summary, hist = campaign(args.trials, args.seed, args.objects,
+                             args.workers, f)
+
+  with open(args.out + '_hist.csv', 'w', newline='') as f:
+    writer = csv.writer(f)
+    writer.writerow(['err_low', 'err_high', 'count'])
+    for i in range(len(hist)):
+      writer.writerow([round(i * HIST_BIN, 6), round((i + 1) * HIST_BIN, 6), hist[i]])
+
+  for key, value in summary.items():
+    print('{0:<15} {1}'.format(key, value))
+
+if __name__ == '__main__':
+  main()
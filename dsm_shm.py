@@ -0,0 +1,367 @@
+'''*-----------------------------------------------------------------------*---
+                                                          Date  : Oct 18 2026
+
+    File Name  : dsm_shm.py
+    Description: Stand-in for the pydsm Client for running the pipeline on
+                 one machine without the DistributedSharedMemory build. Every
+                 buffer is a shared memory segment of its own, so processes
+                 exchange buffers directly, with no server in between.
+
+                 Segment: SEGMENT_HEADER followed by the buffer contents.
+                 Writers make seq odd while writing and even when done, and
+                 readers retry until they copy between two equal even seqs.
+
+                 Differences from pydsm: remote buffers are only found on
+                 this machine, the getters take an optional out buffer to
+                 copy into instead of returning a list, and a reader gives
+                 up with TimeoutError if a writer died mid-write.
+---*-----------------------------------------------------------------------*'''
+
+import struct
+import threading
+import time
+
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+'''----------------------------------------------------------------------------
+Config variables
+----------------------------------------------------------------------------'''
+MAX_NAME_SIZE = 25          #buffer names are cut to MAX_NAME_SIZE - 1
+MAX_BUFFER_SIZE = 0xffff    #buffer lengths are uint16 in the pydsm API
+READ_SPINS = 64             #retries before a reader starts yielding
+READ_TIMEOUT = 1.0          #longest a reader waits for a write to finish, in s
+
+#segment header: seq, length, flags
+SEGMENT_HEADER = struct.Struct('<QII')
+FLAG_ACTIVE = 1             #the creating client is still connected
+FLAG_LOCAL_ONLY = 2         #not visible as a remote buffer
+
+'''[Client]--------------------------------------------------------------------
+  Same methods as pydsm.Client. Local buffers of server serverID are
+  segments named after it, and a remote buffer of serverID is the local
+  buffer of that server on this machine, whatever its address. A remote
+  buffer is active while the client that created it is connected.
+
+  Every buffer has one writer, as with DSM, and writes from threads of one
+  client are serialized.
+----------------------------------------------------------------------------'''
+class Client():
+  '''[__init__]----------------------------------------------------------------
+    Initializes client with no buffers.
+
+    serverID - server whose local buffers this client uses
+    clientID - id of this client, kept for compatibility
+    reset    - clear the contents of existing local buffers when registered
+  --------------------------------------------------------------------------'''
+  def __init__(self, serverID, clientID, reset=True):
+    self.serverID = serverID
+    self.clientID = clientID
+    self.reset = reset
+
+    self.lock = threading.Lock()
+    self.local = {}
+    self.remote = {}
+
+  '''[registerLocalBuffer]-----------------------------------------------------
+    Creates a local buffer, or connects to it if it already exists
+
+    [return] - True if length is valid and matches an existing buffer
+  --------------------------------------------------------------------------'''
+  def registerLocalBuffer(self, name, length, localOnly):
+    if length < 1 or length > MAX_BUFFER_SIZE:
+      return False
+
+    name = key_name(name)
+    if name in self.local:
+      return self.local[name].length == length
+
+    flags = FLAG_ACTIVE | (FLAG_LOCAL_ONLY if localOnly else 0)
+    try:
+      buf = segment(segment_name(self.serverID, name), length, flags)
+    except FileExistsError:
+      #left by a client that did not close, or shared with a live one
+      buf = segment(segment_name(self.serverID, name))
+      if buf.length != length:
+        if buf.active():
+          buf.close()
+          return False
+        buf.owner = True
+        buf.close()
+        buf = segment(segment_name(self.serverID, name), length, flags)
+      else:
+        buf.take_over(flags)
+        if self.reset:
+          buf.write(bytes(length))
+
+    self.local[name] = buf
+    return True
+
+  '''[registerRemoteBuffer]----------------------------------------------------
+    Starts following a remote buffer. It does not need to exist yet.
+  --------------------------------------------------------------------------'''
+  def registerRemoteBuffer(self, name, ipaddr, serverID):
+    self.remote.setdefault((key_name(name), ipaddr, serverID), None)
+    return True
+
+  '''[disconnectFromLocalBuffer]-----------------------------------------------
+    Stops using a local buffer, removing it if this client created it
+  --------------------------------------------------------------------------'''
+  def disconnectFromLocalBuffer(self, name):
+    buf = self.local.pop(key_name(name), None)
+    if buf is None:
+      return False
+    buf.close()
+    return True
+
+  '''[disconnectFromRemoteBuffer]----------------------------------------------
+    Stops following a remote buffer
+  --------------------------------------------------------------------------'''
+  def disconnectFromRemoteBuffer(self, name, ipaddr, serverID):
+    key = (key_name(name), ipaddr, serverID)
+    if key not in self.remote:
+      return False
+    buf = self.remote.pop(key)
+    if buf is not None:
+      buf.close()
+    return True
+
+  '''[doesLocalExist]----------------------------------------------------------
+    [return] - length of a local buffer, 0 if it is not registered
+  --------------------------------------------------------------------------'''
+  def doesLocalExist(self, name):
+    buf = self.local.get(key_name(name))
+    return buf.length if buf is not None else 0
+
+  '''[doesRemoteExist]---------------------------------------------------------
+    [return] - length of a remote buffer, 0 if it is not registered or its
+               server has not created it
+  --------------------------------------------------------------------------'''
+  def doesRemoteExist(self, name, ipaddr, serverID):
+    buf = self.get_remote(name, ipaddr, serverID)
+    return buf.length if buf is not None else 0
+
+  '''[isRemoteActive]----------------------------------------------------------
+    [return] - whether the client that created a remote buffer is connected
+  --------------------------------------------------------------------------'''
+  def isRemoteActive(self, name, ipaddr, serverID):
+    buf = self.get_remote(name, ipaddr, serverID)
+    return buf is not None and buf.active()
+
+  '''[getLocalBufferContents]--------------------------------------------------
+    Copies out a consistent snapshot of a local buffer.
+
+    out      - writable buffer of at least the buffer length to copy into,
+               or None for a list of byte values, as pydsm returns
+    [return] - contents, empty if the buffer is not registered
+  --------------------------------------------------------------------------'''
+  def getLocalBufferContents(self, name, out=None):
+    buf = self.local.get(key_name(name))
+    if buf is None:
+      return []
+    return buf.read(out)
+
+  '''[setLocalBufferContents]--------------------------------------------------
+    Copies data into a local buffer. Like pydsm, which takes a std::string,
+    data has to be bytes or str, and str is encoded as UTF-8. Anything else
+    raises TypeError, as it does with pydsm, so local runs catch callers
+    that would fail against the real client. Data shorter than the buffer
+    is padded with zeros, and longer data is cut to the buffer length.
+
+    [return] - True if the buffer is registered
+  --------------------------------------------------------------------------'''
+  def setLocalBufferContents(self, name, data):
+    if isinstance(data, str):
+      data = data.encode('utf-8')
+    if not isinstance(data, bytes):
+      raise TypeError('setLocalBufferContents takes bytes or str, not ' +
+                      type(data).__name__)
+
+    buf = self.local.get(key_name(name))
+    if buf is None:
+      return False
+
+    if len(data) != buf.length:
+      data = data[:buf.length].ljust(buf.length, b'\0')
+
+    with self.lock:
+      buf.write(data)
+    return True
+
+  '''[getRemoteBufferContents]-------------------------------------------------
+    Copies out a consistent snapshot of a remote buffer.
+
+    out      - see getLocalBufferContents
+    [return] - contents, empty if the buffer is not available, and whether
+               it is active
+  --------------------------------------------------------------------------'''
+  def getRemoteBufferContents(self, name, ipaddr, serverID, out=None):
+    buf = self.get_remote(name, ipaddr, serverID)
+    if buf is None:
+      return [], False
+    return buf.read(out), buf.active()
+
+  '''[get_remote]--------------------------------------------------------------
+    Connects a registered remote buffer to its segment on first use
+
+    [return] - segment, or None if unavailable
+  --------------------------------------------------------------------------'''
+  def get_remote(self, name, ipaddr, serverID):
+    key = (key_name(name), ipaddr, serverID)
+    if key not in self.remote:
+      return None
+
+    buf = self.remote[key]
+    if buf is None:
+      try:
+        buf = segment(segment_name(serverID, key[0]))
+      except FileNotFoundError:
+        return None
+
+      if buf.flags() & FLAG_LOCAL_ONLY:
+        buf.close()
+        return None
+      self.remote[key] = buf
+
+    return buf
+
+  '''[close]-------------------------------------------------------------------
+    Disconnects from every buffer, removing those this client created. Like
+    the pydsm Client, this also happens when the client is destroyed.
+  --------------------------------------------------------------------------'''
+  def close(self):
+    for name in list(self.local):
+      self.disconnectFromLocalBuffer(name)
+    for key in list(self.remote):
+      self.disconnectFromRemoteBuffer(*key)
+
+  def __del__(self):
+    self.close()
+
+'''[segment]-------------------------------------------------------------------
+  One buffer in shared memory with its seqlock header. Segments are created
+  when a length is given, and connected to otherwise.
+----------------------------------------------------------------------------'''
+class segment():
+  '''[__init__]----------------------------------------------------------------
+    Creates or connects to a segment.
+
+    name   - segment name
+    length - buffer length to create it with, None to connect to it
+    flags  - flags to create it with
+  --------------------------------------------------------------------------'''
+  def __init__(self, name, length=None, flags=0):
+    self.owner = length is not None
+
+    if self.owner:
+      self.shm = shared_memory.SharedMemory(name, True,
+                                            SEGMENT_HEADER.size + length)
+      SEGMENT_HEADER.pack_into(self.shm.buf, 0, 0, length, flags)
+    else:
+      self.shm = shared_memory.SharedMemory(name)
+
+    #the resource tracker would remove it when any process using it exits,
+    #so it is left to close of the creator instead
+    resource_tracker.unregister(self.shm._name, 'shared_memory')
+
+    self.length = SEGMENT_HEADER.unpack_from(self.shm.buf)[1]
+
+    #seq and flags are single aligned words, so every access is atomic
+    self.seq = np.ndarray(1, dtype='<u8', buffer=self.shm.buf)
+    self.flag_word = np.ndarray(1, dtype='<u4', buffer=self.shm.buf, offset=12)
+    self.data = np.ndarray(self.length, dtype=np.uint8, buffer=self.shm.buf,
+                           offset=SEGMENT_HEADER.size)
+
+  '''[flags]-------------------------------------------------------------------
+    [return] - current flags
+  --------------------------------------------------------------------------'''
+  def flags(self):
+    return int(self.flag_word[0])
+
+  '''[active]------------------------------------------------------------------
+    [return] - whether the creating client is still connected
+  --------------------------------------------------------------------------'''
+  def active(self):
+    return bool(self.flags() & FLAG_ACTIVE)
+
+  '''[take_over]---------------------------------------------------------------
+    Makes this connection the creator of an existing segment, so it is
+    marked active and removed on close. A writer that died mid-write left
+    seq odd, which is evened out.
+  --------------------------------------------------------------------------'''
+  def take_over(self, flags):
+    self.owner = True
+    self.flag_word[0] = flags
+    if self.seq[0] & 1:
+      self.seq[0] += 1
+
+  '''[write]-------------------------------------------------------------------
+    Copies bytes of exactly length in, odd seq marking the write. seq is
+    evened out even if the copy fails, so readers are never locked out.
+  --------------------------------------------------------------------------'''
+  def write(self, data):
+    self.seq[0] += 1
+    try:
+      self.data[:] = np.frombuffer(data, dtype=np.uint8)
+    finally:
+      self.seq[0] += 1
+
+  '''[read]--------------------------------------------------------------------
+    Copies contents out, retrying while a write overlaps the copy. Raises
+    TimeoutError if no write finishes within READ_TIMEOUT, as when the
+    writer died mid-write.
+
+    out      - writable buffer to copy into, or None for a list of bytes
+    [return] - out, or the list of bytes
+  --------------------------------------------------------------------------'''
+  def read(self, out=None):
+    target = np.empty(self.length, dtype=np.uint8) if out is None else \
+             np.frombuffer(out, dtype=np.uint8, count=self.length)
+
+    spins = 0
+    deadline = None
+    while True:
+      start = int(self.seq[0])
+      if not start & 1:
+        target[:] = self.data
+        if int(self.seq[0]) == start:
+          break
+
+      spins += 1
+      if spins > READ_SPINS:
+        if deadline is None:
+          deadline = time.monotonic() + READ_TIMEOUT
+        elif time.monotonic() > deadline:
+          raise TimeoutError('segment {0} stayed mid-write for {1} s'.format(
+                             self.shm.name, READ_TIMEOUT))
+        time.sleep(0)
+
+    return target.tolist() if out is None else out
+
+  '''[close]-------------------------------------------------------------------
+    Disconnects, marking the buffer inactive and removing it if created here
+  --------------------------------------------------------------------------'''
+  def close(self):
+    if self.owner:
+      self.flag_word[0] = self.flags() & ~FLAG_ACTIVE
+
+    #views into the mapping have to go before it can be closed
+    del self.seq, self.flag_word, self.data
+    self.shm.close()
+
+    if self.owner:
+      resource_tracker.register(self.shm._name, 'shared_memory')
+      self.shm.unlink()
+
+'''[key_name]------------------------------------------------------------------
+  Cuts a buffer name to the length DSM keys keep
+----------------------------------------------------------------------------'''
+def key_name(name):
+  return name[:MAX_NAME_SIZE - 1]
+
+'''[segment_name]--------------------------------------------------------------
+  Gets the shared memory name of a local buffer of a server
+----------------------------------------------------------------------------'''
+def segment_name(serverID, name):
+  return 'dsm{0}.{1}'.format(serverID, name)
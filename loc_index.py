@@ -0,0 +1,76 @@
+'''*-----------------------------------------------------------------------*---
+                                                          Date  : Oct 18 2026
+
+    File Name  : loc_index.py
+    Description: Spatial hash of found locations, used to reject duplicate
+                 locations in constant time.
+---*-----------------------------------------------------------------------*'''
+
+import math
+
+'''[loc_index]-----------------------------------------------------------------
+  Voxel grid of locations keyed on the object tolerance. A location is a
+  duplicate if an existing one is within tol on every axis, so only the 27
+  voxels surrounding it need to be checked.
+----------------------------------------------------------------------------'''
+class loc_index():
+  '''[__init__]----------------------------------------------------------------
+    Initializes an empty index with the given duplicate tolerance
+  --------------------------------------------------------------------------'''
+  def __init__(self, tol):
+    self.tol = tol
+    self.voxels = {}
+    self.locs = []
+
+  def __len__(self):
+    return len(self.locs)
+
+  '''[voxel]-------------------------------------------------------------------
+    Gets the voxel key containing loc
+  --------------------------------------------------------------------------'''
+  def voxel(self, loc):
+    return (math.floor(loc[0] / self.tol),
+            math.floor(loc[1] / self.tol),
+            math.floor(loc[2] / self.tol))
+
+  '''[query]-------------------------------------------------------------------
+    Checks whether a stored location is within tol of loc on every axis,
+    inclusive.
+  --------------------------------------------------------------------------'''
+  def query(self, loc):
+    vx, vy, vz = self.voxel(loc)
+
+    for x in range(vx - 1, vx + 2):
+      for y in range(vy - 1, vy + 2):
+        for z in range(vz - 1, vz + 2):
+          for i in self.voxels.get((x, y, z), ()):
+            other = self.locs[i]
+            if abs(other[0] - loc[0]) <= self.tol and \
+               abs(other[1] - loc[1]) <= self.tol and \
+               abs(other[2] - loc[2]) <= self.tol:
+              return True
+    return False
+
+  '''[insert]------------------------------------------------------------------
+    Stores loc in the index
+  --------------------------------------------------------------------------'''
+  def insert(self, loc):
+    self.voxels.setdefault(self.voxel(loc), []).append(len(self.locs))
+    self.locs.append(loc)
+
+  '''[add]---------------------------------------------------------------------
+    Stores loc unless it is a duplicate of a stored location.
+    [return] - True if loc was stored
+  --------------------------------------------------------------------------'''
+  def add(self, loc):
+    if self.query(loc):
+      return False
+    self.insert(loc)
+    return True
+
+  '''[clear]-------------------------------------------------------------------
+    Removes all stored locations
+  --------------------------------------------------------------------------'''
+  def clear(self):
+    self.voxels = {}
+    self.locs = []
@@ -7,21 +7,203 @@
                          
 ---*-----------------------------------------------------------------------*'''
 
+import numpy as np
+
+SPEED_WAVE = 1482
+REFINE_ITERS = 4            #Gauss-Newton iterations after multilaterate
+FRONT = np.array([0, 1, 0]) #side of planar arrays objects are on
+
+'''[calc_time_matrix]----------------------------------------------------------
+  Calculates times from an emitter at the origin to every object and back to
+  every receiver at once.
+
+  obj_locs    - (N, 3) array of object locations
+  rcvr_locs   - (S, 3) array of receiver locations
+  sample_rate - receiver sample rate
+  exact       - whether to return exact times or times quantized to samples
+  [return]    - (N, S) array of times
+----------------------------------------------------------------------------'''
+def calc_time_matrix(obj_locs, rcvr_locs, sample_rate, exact):
+  obj_locs = np.asarray(obj_locs, dtype=float).reshape(-1, 3)
+  rcvr_locs = np.asarray(rcvr_locs, dtype=float).reshape(-1, 3)
+
+  #accumulate per axis so no (N, S, 3) intermediate is built
+  dist_OR = np.zeros((len(obj_locs), len(rcvr_locs)))
+  for axis in range(3):
+    dist_OR += (obj_locs[:, axis, None] - rcvr_locs[None, :, axis]) ** 2
+  np.sqrt(dist_OR, out=dist_OR)
+
+  dist_EO = np.sqrt((obj_locs ** 2).sum(axis=1))
+
+  times = dist_OR
+  times += dist_EO[:, None]
+  times /= SPEED_WAVE
+
+  if not exact:
+    times += 1 / sample_rate - times % (1 / sample_rate)
+
+  return times
+
 class sensor_array():
   '''[__init__]----------------------------------------------------------------
-    Initializes sensor_array with the appropriate positions
+    Initializes sensor_array as the 4 receiver T layout, with receiver 1 at
+    the emitter, receivers 2 and 3 on the x axis, and receiver 4 on the z
+    axis. Use from_locs for any other layout.
   --------------------------------------------------------------------------'''
   def __init__(self, x1, x2, z3, sample):
-    self.sensor_locs = [[0] * 3 for x in range(4)]
+    self.sensor_locs = np.zeros((4, 3))
     self.sensor_locs[1][0] = x1
     self.sensor_locs[2][0] = x2
     self.sensor_locs[3][2] = z3
     self.sample_rate = sample
+    self.update()
+
+  '''[from_locs]---------------------------------------------------------------
+    Creates a sensor_array from (S, 3) receiver positions, S >= 4
+  --------------------------------------------------------------------------'''
+  @classmethod
+  def from_locs(cls, locs, sample):
+    self = cls.__new__(cls)
+    self.sensor_locs = np.array(locs, dtype=float).reshape(-1, 3)
+    if len(self.sensor_locs) < 4:
+      raise ValueError('need at least 4 receivers, got ' + str(len(self.sensor_locs)))
+    self.sample_rate = sample
+    self.update()
+    return self
+
+  '''[__len__]-----------------------------------------------------------------
+    Number of receivers
+  --------------------------------------------------------------------------'''
+  def __len__(self):
+    return len(self.sensor_locs)
 
   '''[set_loc]-----------------------------------------------------------------
     Sets location of 1 receiver
   --------------------------------------------------------------------------'''
   def set_loc(self, rcvr, x, y, z):
-    self.sensor_locs[rcvr][0] = x
-    self.sensor_locs[rcvr][1] = y
-    self.sensor_locs[rcvr][2] = z
+    self.sensor_locs[rcvr] = (x, y, z)
+    self.update()
+
+  '''[calc_times]--------------------------------------------------------------
+    Calculates times of (N, 3) object locations at every receiver
+    [return] - (N, S) array of times
+  --------------------------------------------------------------------------'''
+  def calc_times(self, obj_locs, exact):
+    return calc_time_matrix(obj_locs, self.locs, self.sample_rate, exact)
+
+  '''[locate]------------------------------------------------------------------
+    Solves (N, S) sets of receiver times by least squares multilateration,
+    see multilaterate. Works for any layout.
+
+    tol      - largest root sum square time residual of a solution, in s
+    [return] - (N,) mask of successful resolutions, (N, 3) array of locations
+  --------------------------------------------------------------------------'''
+  def locate(self, times, tol, iters=REFINE_ITERS):
+    times = np.asarray(times, dtype=float).reshape(-1, len(self))
+
+    with np.errstate(invalid='ignore', over='ignore', divide='ignore'):
+      locs = multilaterate(times, self.locs, iters, self.front)
+      res = np.sqrt(((self.calc_times(locs, True) - times) ** 2).sum(axis=1))
+
+    return res <= tol, locs
+
+  '''[update]------------------------------------------------------------------
+    Recomputes quantities derived from receiver positions. Called whenever
+    positions change, so the solver never has to recompute them.
+
+    locs   - (S, 3) array of receiver positions
+    tshape - whether the layout is the T layout the ellipse solver needs
+    half   - half baselines of the 3 ellipses used by the ellipse solver
+    half2  - half ** 2
+    half3  - half ** 3
+    max_dt - largest possible time difference between each pair of receivers
+    front  - side of a planar array objects are on, None if not planar
+  --------------------------------------------------------------------------'''
+  def update(self):
+    self.locs = np.array(self.sensor_locs, dtype=float)
+
+    self.tshape = False
+    if len(self.locs) == 4:
+      off_axis = self.locs.copy()
+      off_axis[1][0] = off_axis[2][0] = off_axis[3][2] = 0
+      self.tshape = not off_axis.any()
+
+    self.half = np.array([self.locs[1][0], self.locs[2][0], self.locs[3][2]]) / 2
+    self.half2 = self.half ** 2
+    self.half3 = self.half ** 3
+
+    self.max_dt = np.linalg.norm(self.locs[:, None] - self.locs[None], axis=2)
+    self.max_dt /= SPEED_WAVE
+
+    #receivers in a plane through the emitter cannot tell which side of the
+    #plane an echo came from, so objects are assumed in front of it
+    u, sv, vt = np.linalg.svd(self.locs)
+    self.front = None
+    if sv[-1] <= sv[0] * 1e-9:
+      self.front = vt[-1] * (1 if vt[-1] @ FRONT >= 0 else -1)
+
+'''[multilaterate]-------------------------------------------------------------
+  Solves object locations from times at any number of receivers. With the
+  emitter at the origin, |O - R| = d - |O| turns every receiver's range sum d
+  into an equation linear in O and |O|:
+
+    2 d |O| - 2 R . O = d^2 - |R|^2
+
+  which is solved in the least squares sense for a starting location, then
+  refined with refine_locs.
+
+  times     - (N, S) array of exact times at every receiver
+  rcvr_locs - (S, 3) array of receiver locations
+  iters     - number of refinement iterations
+  front     - unit normal of a planar array's front side, None if not planar
+  [return]  - (N, 3) array of locations
+----------------------------------------------------------------------------'''
+def multilaterate(times, rcvr_locs, iters, front=None):
+  rcvr_locs = np.asarray(rcvr_locs, dtype=float).reshape(-1, 3)
+  dist = np.asarray(times, dtype=float).reshape(-1, len(rcvr_locs)) * SPEED_WAVE
+
+  A = np.empty(dist.shape + (4,))
+  A[:, :, :3] = -2 * rcvr_locs
+  A[:, :, 3] = 2 * dist
+  b = dist ** 2 - (rcvr_locs ** 2).sum(axis=1)
+
+  #minimum norm solution leaves the out of plane part of planar arrays at 0
+  x = (np.linalg.pinv(A) @ b[:, :, None])[:, :, 0]
+  locs = x[:, :3]
+
+  if front is not None:
+    depth = np.sqrt(np.maximum(x[:, 3] ** 2 - (locs ** 2).sum(axis=1), 0))
+    locs += depth[:, None] * front
+
+  return refine_locs(locs, dist / SPEED_WAVE, rcvr_locs, iters)
+
+'''[refine_locs]---------------------------------------------------------------
+  Improves object locations with Gauss-Newton iterations, so that their
+  calculated times match measured times in the least squares sense.
+
+  locs      - (N, 3) array of starting locations
+  times     - (N, S) array of measured exact times at every receiver
+  rcvr_locs - (S, 3) array of receiver locations
+  iters     - number of iterations
+  [return]  - (N, 3) array of refined locations
+----------------------------------------------------------------------------'''
+def refine_locs(locs, times, rcvr_locs, iters):
+  locs = np.array(locs, dtype=float).reshape(-1, 3)
+  rcvr_locs = np.asarray(rcvr_locs, dtype=float).reshape(-1, 3)
+  times = np.asarray(times, dtype=float).reshape(-1, len(rcvr_locs))
+
+  for i in range(iters):
+    dist_EO = np.maximum(np.linalg.norm(locs, axis=1), 1e-9)
+    diff = locs[:, None, :] - rcvr_locs[None]
+    dist_OR = np.maximum(np.linalg.norm(diff, axis=2), 1e-9)
+
+    #residuals and jacobian of times with respect to location, in m
+    res = times * SPEED_WAVE - (dist_EO[:, None] + dist_OR)
+    J = (locs / dist_EO[:, None])[:, None, :] + diff / dist_OR[:, :, None]
+
+    JT = J.transpose(0, 2, 1)
+    JTJ = JT @ J + np.eye(3) * 1e-9
+    step = np.linalg.solve(JTJ, (JT @ res[:, :, None]))[:, :, 0]
+    locs += step
+
+  return locs
@@ -14,6 +14,8 @@
 import numpy as np
 import time
 from math import pow
+import loc_index
+import sensor_array
 
 #------------------------------------------------------------------------------
 #[RUN VARS]--------------------------------------------------------------------
@@ -35,9 +37,6 @@ TOL_DIST      = 3          #ellipse-circle intersection tolerance
 TOL_OBJ       = 0.25       #multiple object detection tolerance
 SPEED_WAVE    = 1482       #speed of sound in water
 EXTRA_FACTOR  = 2          #allocate space in case extra objects are found
-sensArr       = np.zeros((SENS_NUM, 3 + NUM_OBJECTS))
-objs          = np.zeros((NUM_OBJECTS * EXTRA_FACTOR, 3))
-
 #TODO new, needs comments
 '''
 for obj in range(0, NUM_OBJECTS):
@@ -49,126 +48,45 @@ for obj in range(0, NUM_OBJECTS):
 f.close()
 '''
 
-  #sensArr[rcvr][0]  -> receiver x
-  #sensArr[rcvr][1]  -> receiver y
-  #sensArr[rcvr][2]  -> receiver z
-  #sensArr[rcvr][3+] -> object times
-
-sensArr[0][0] = 0
-sensArr[0][1] = 0
-sensArr[0][2] = 0
-
-sensArr[1][0] = -0.15
-sensArr[1][1] = 0
-sensArr[1][2] = 0
-
-sensArr[2][0] = .25
-sensArr[2][1] = 0
-sensArr[2][2] = 0
-
-sensArr[3][0] = 0
-sensArr[3][1] = 0
-sensArr[3][2] = .20
-
-
-  #objs[object][0] -> object x
-  #objs[object][1] -> object y
-  #objs[object][2] -> object z
-
-objs[0][0]    = 33
-objs[0][1]    = 36
-objs[0][2]    = 27
-
-objs[1][0]    = -35
-objs[1][1]    = 43
-objs[1][2]    = -15
+  #SENS_LOCS[rcvr] -> receiver x, y, z
 
-objs[2][0]    = 36
-objs[2][1]    = 42
-objs[2][2]    = -1
+SENS_LOCS     = [[0,     0, 0],
+                 [-0.15, 0, 0],
+                 [.25,   0, 0],
+                 [0,     0, .20]]
 
-objs[3][0]    = -29
-objs[3][1]    = 12
-objs[3][2]    = -23
-
-objs[4][0]    = 40
-objs[4][1]    = 9
-objs[4][2]    = 13
-
-objs[5][0]    = -24
-objs[5][1]    = 40
-objs[5][2]    = -24
-
-objs[6][0]    = 22
-objs[6][1]    = 36
-objs[6][2]    = -39
-
-objs[7][0]    = 18
-objs[7][1]    = 17
-objs[7][2]    = -21
+  #OBJ_LOCS[object] -> object x, y, z
 
+OBJ_LOCS      = [[ 33,  36,  27],
+                 [-35,  43, -15],
+                 [ 36,  42,  -1],
+                 [-29,  12, -23],
+                 [ 40,   9,  13],
+                 [-24,  40, -24],
+                 [ 22,  36, -39],
+                 [ 18,  17, -21]]
 
 '''
-objs[0][0]    = 5
-objs[0][1]    = 3
-objs[0][2]    = 2
-
-objs[1][0]    = -5
-objs[1][1]    = 3
-objs[1][2]    = -2
+OBJ_LOCS      = [[  5,   3,   2],
+                 [ -5,   3,  -2]]
 '''
 '''
-objs[0][0]    = 1
-objs[0][1]    = 1
-objs[0][2]    = 1
-
-objs[1][0]    = -1
-objs[1][1]    = 1
-objs[1][2]    = 1
-
-objs[2][0]    = 0
-objs[2][1]    = 1
-objs[2][2]    = 1
-
-objs[3][0]    = 0
-objs[3][1]    = 3
-objs[3][2]    = -3
-
-objs[4][0]    = 5
-objs[4][1]    = 3
-objs[4][2]    = 2
-
-objs[5][0]    = -5
-objs[5][1]    = 3
-objs[5][2]    = -2
-
-objs[6][0]    = 0
-objs[6][1]    = 10
-objs[6][2]    = 10
-
-objs[7][0]    = 5
-objs[7][1]    = 10
-objs[7][2]    = 10
-
-objs[8][0]    = -5
-objs[8][1]    = 10
-objs[8][2]    = 10
-
-objs[9][0]    = 15
-objs[9][1]    = 15
-objs[9][2]    = 15
-
-objs[10][0]   = -20
-objs[10][1]   = 20
-objs[10][2]   = 50
-
-objs[11][0]   = 0
-objs[11][1]   = 25
-objs[11][2]   = 50
+OBJ_LOCS      = [[  1,   1,   1],
+                 [ -1,   1,   1],
+                 [  0,   1,   1],
+                 [  0,   3,  -3],
+                 [  5,   3,   2],
+                 [ -5,   3,  -2],
+                 [  0,  10,  10],
+                 [  5,  10,  10],
+                 [ -5,  10,  10],
+                 [ 15,  15,  15],
+                 [-20,  20,  50],
+                 [  0,  25,  50]]
 '''
 #DEBUG-------------------------------------------------------------------------
-INTER_ELL_DEBUG = 1
-CALC_TIME_DEBUG = 1
+INTER_ELL_DEBUG = 0
+CALC_TIME_DEBUG = 0
 
 #------------------------------------------------------------------------------
 #------------------------------------------------------------------------------
@@ -210,6 +128,7 @@ def CEIntersect(a, b, c):
 '''resolveTArray---------------------------------------------------------------
 Calculates object location in 3D using 4 receiver times.
 
+sens     - (4, 3+) array of receiver positions, see driver
 time1    - receiver 1 time
 time2    - receiver 2 time
 time3    - receiver 3 time
@@ -218,7 +137,7 @@ tol      - tolerance for variance in x
 [return] - array with 3 elements containing x, y, and z coordinate of object
            will return 0 0 if finds nothing
 ----------------------------------------------------------------------------'''
-def resolveTArray(time1, time2, time3, time4, tol, debug):
+def resolveTArray(sens, time1, time2, time3, time4, tol, debug):
   #                  r3
   #                  |
   #             r1---E---r2
@@ -240,9 +159,9 @@ def resolveTArray(time1, time2, time3, time4, tol, debug):
   #emitter radius squared
   r2 = pow(time1 * SPEED_WAVE / 2, 2)
 
-  rcvr[0][0] = sensArr[1][0]
-  rcvr[1][0] = sensArr[2][0]
-  rcvr[2][0] = sensArr[3][2]
+  rcvr[0][0] = sens[1][0]
+  rcvr[1][0] = sens[2][0]
+  rcvr[2][0] = sens[3][2]
 
   rcvr[0][1] = time2
   rcvr[1][1] = time3
@@ -380,17 +299,34 @@ def calcTime(xObj, yObj, zObj, xRcvr, yRcvr, zRcvr, exact, debug):
 
 '''Driver----------------------------------------------------------------------
 Initializes time table, object times, and prints time table through delegation
+
+sens_locs - receiver x, y, z, one row per receiver
+obj_locs  - object x, y, z, one row per object
+sample    - sensor sample rate
+[return]  - (len(obj_locs) * EXTRA_FACTOR, 3) array of found locs, zero padded
 ----------------------------------------------------------------------------'''
-def driver():
+def driver(sens_locs=SENS_LOCS, obj_locs=OBJ_LOCS, sample=SENS_SAMPLE):
   start = time.time() * 1000
 
+  num_objs = len(obj_locs)
+
+  #sensArr[rcvr][0:3] -> receiver x, y, z
+  #sensArr[rcvr][3+]  -> object times
+  sensArr = np.zeros((SENS_NUM, 3 + num_objs))
+  sensArr[:, :3] = sens_locs
+
+  objs = np.zeros((num_objs * EXTRA_FACTOR, 3))
+  objs[:num_objs] = obj_locs
+
   #initialize objs array with times
-  for obj in range(0, NUM_OBJECTS):
-    for rcvr in range(0, SENS_NUM):
-      sensArr[rcvr][3 + obj] = calcTime(objs[obj][0], objs[obj][1], 
-                                        objs[obj][2], sensArr[rcvr][0], 
-                                        sensArr[rcvr][1], sensArr[rcvr][2], 
-                                        0, CALC_TIME_DEBUG)
+  times = sensor_array.calc_time_matrix(objs[:num_objs], sensArr[:, :3],
+                                        sample, 0)
+  sensArr[:, 3:3 + num_objs] = times.T
+
+  if CALC_TIME_DEBUG:
+    for obj in range(0, num_objs):
+      print('DEBUG - CT - {0:4.2f} {1:4.2f} {2:4.2f} {3}'.format(
+            objs[obj][0], objs[obj][1], objs[obj][2], times[obj]))
 
   #clear file, all subsequent writes append to this file
   #file = open('timeTable', 'w')
@@ -400,30 +336,26 @@ def driver():
   #printPossibleLocs(TOLERANCE)
   '''
   #single object ellipse intersection detection
-  for obj1 in range(0, NUM_OBJECTS):
+  for obj1 in range(0, num_objs):
     intersectEllipse(objs[obj1][2], objs[obj1][3], objs[obj1][4], TOL_DIST)
   '''
   #multiple object ellipse intersection detection
   i = 0
-  locs = np.zeros((NUM_OBJECTS * EXTRA_FACTOR, 3))
-  for obj1 in range(0, NUM_OBJECTS):
-    for obj2 in range(0, NUM_OBJECTS):
-      for obj3 in range(0, NUM_OBJECTS):
-        for obj4 in range(0, NUM_OBJECTS):
+  locs = np.zeros((num_objs * EXTRA_FACTOR, 3))
+  found = loc_index.loc_index(TOL_OBJ)
+  for obj1 in range(0, num_objs):
+    for obj2 in range(0, num_objs):
+      for obj3 in range(0, num_objs):
+        for obj4 in range(0, num_objs):
           if(sensArr[0][3 + obj1] == 0 or sensArr[1][3 + obj2] == 0 or 
              sensArr[2][3 + obj3] == 0 or sensArr[3][3 + obj4] == 0):
             continue
-          result = resolveTArray(sensArr[0][3 + obj1], sensArr[1][3 + obj2],
+          result = resolveTArray(sensArr,
+                                 sensArr[0][3 + obj1], sensArr[1][3 + obj2],
                                  sensArr[2][3 + obj3], sensArr[3][3 + obj4],
                                  TOL_DIST, INTER_ELL_DEBUG)
           if(result[2] != 0):
-            dup = 0
-            for j in range(0, i):
-              if(isInRange(locs[j][0] - TOL_OBJ, locs[j][0] + TOL_OBJ, result[0]) and
-                 isInRange(locs[j][1] - TOL_OBJ, locs[j][1] + TOL_OBJ, result[1]) and
-                 isInRange(locs[j][2] - TOL_OBJ, locs[j][2] + TOL_OBJ, result[2])):
-                dup = 1
-            if dup == 0:
+            if found.add(result):
               for k in range(0, 3):
                 locs[i][k] = result[k]
               i = i + 1
@@ -457,7 +389,7 @@ def driver():
   print('      +-------------------------+-------------------------+')
   print('      |  X       Y       Z      |  X       Y       Z      |')  
   print('      +=========================+=========================+')
-  for i in range(0, NUM_OBJECTS * EXTRA_FACTOR):
+  for i in range(0, num_objs * EXTRA_FACTOR):
     print('   {} '.format(repr(i + 1).rjust(2)), end = '|\t')
     if(locs[i][2] == 0):
       print('\t\t\t|', end = '')
@@ -474,4 +406,13 @@ def driver():
                                                    objs[i][2]))
   print('      +-------------------------+-------------------------+')  
 
-driver()
+  return locs
+
+'''main------------------------------------------------------------------------
+Runs the simulation on the default scene
+----------------------------------------------------------------------------'''
+def main():
+  driver()
+
+if __name__ == '__main__':
+  main()
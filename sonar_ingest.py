@@ -0,0 +1,227 @@
+'''*-----------------------------------------------------------------------*---
+                                                          Date  : Oct 18 2026
+
+    File Name  : sonar_ingest.py
+    Description: Receives raw ping samples over UDP multicast and hands each
+                 complete ping to a sonar_processor. The receiver sleeps in
+                 a selector until datagrams arrive, reads them into one
+                 preallocated buffer, and assembles pings in a fixed pool of
+                 sample buffers.
+
+                 Datagram: PACKET_HEADER followed by count frames of
+                 interleaved channel samples in CAPTURE_FORMATS[fmt], the
+                 samples offset to offset + count of a ping total frames long.
+---*-----------------------------------------------------------------------*'''
+
+import selectors
+import socket
+import struct
+import threading
+
+import numpy as np
+
+import sonar_processor
+
+'''----------------------------------------------------------------------------
+Config variables
+----------------------------------------------------------------------------'''
+MCAST_GROUP = '239.255.42.1'
+MCAST_PORT = 4242
+MCAST_IFACE = '0.0.0.0'     #interface to join the group on
+MAX_DATAGRAM = 65507
+MAX_FRAMES = 1 << 18        #longest ping, in frames
+RECV_BUFFER = 1 << 22       #socket receive buffer, in bytes
+
+#packet header: magic, ping, channels, sample format, offset, total frames
+PACKET_MAGIC = b'SNRP'
+PACKET_HEADER = struct.Struct('<4sIHHII')
+
+'''[sonar_ingest]--------------------------------------------------------------
+  Receiver thread for one multicast group. Pings are assembled in a pool of
+  queue_size + 2 buffers, which is enough that a buffer is never reused while
+  the processor still has it queued or in progress. Frames of a ping that
+  never arrive are left at 0 and counted in lost, and datagrams of a ping
+  already handed over, or older than the one being assembled, are counted
+  in stale and ignored.
+----------------------------------------------------------------------------'''
+class sonar_ingest(threading.Thread):
+  '''[__init__]----------------------------------------------------------------
+    Joins the group and starts receiving.
+
+    processor  - sonar_processor complete pings are sent to with GO
+    channels   - number of receivers in each ping
+    group      - multicast group address
+    port       - UDP port
+    iface      - address of the interface to join the group on
+    max_frames - longest ping, in frames
+  --------------------------------------------------------------------------'''
+  def __init__(self, processor, channels, group=MCAST_GROUP, port=MCAST_PORT,
+               iface=MCAST_IFACE, max_frames=MAX_FRAMES):
+    super(sonar_ingest, self).__init__()
+    self.daemon = True
+
+    self.processor = processor
+    self.channels = channels
+    self.max_frames = max_frames
+
+    self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER)
+    self.sock.bind(('', port))
+    self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                         socket.inet_aton(group) + socket.inet_aton(iface))
+    self.sock.setblocking(False)
+
+    #written to by close to wake the selector
+    self.wake_r, self.wake_w = socket.socketpair()
+    self.selector = selectors.DefaultSelector()
+    self.selector.register(self.sock, selectors.EVENT_READ)
+    self.selector.register(self.wake_r, selectors.EVENT_READ)
+
+    #datagram buffer, with one sample view per format over its payload
+    self.packet = bytearray(MAX_DATAGRAM)
+    self.packet_view = memoryview(self.packet)
+    self.payloads = [np.frombuffer(self.packet, dtype=fmt, offset=PACKET_HEADER.size,
+                                   count=(MAX_DATAGRAM - PACKET_HEADER.size) //
+                                         np.dtype(fmt).itemsize)
+                     for fmt in sonar_processor.CAPTURE_FORMATS]
+
+    self.pool = np.zeros((processor.queue_size + 2, channels, max_frames),
+                         dtype=np.float32)
+    self.slot = 0
+    self.ping = None
+    self.done = None
+    self.total = 0
+    self.received = 0
+
+    self.pings = 0
+    self.lost = 0
+    self.bad = 0
+    self.stale = 0
+
+    self.start()
+
+  '''[close]-------------------------------------------------------------------
+    Stops receiving, handing over any partly received ping first
+  --------------------------------------------------------------------------'''
+  def close(self):
+    self.wake_w.send(b'\0')
+    self.join()
+
+    self.selector.close()
+    self.sock.close()
+    self.wake_r.close()
+    self.wake_w.close()
+
+  '''[run]---------------------------------------------------------------------
+    Sleeps until datagrams arrive, then reads until the socket is empty
+  --------------------------------------------------------------------------'''
+  def run(self):
+    while True:
+      for key, events in self.selector.select():
+        if key.fileobj is self.wake_r:
+          self.finish()
+          return
+
+        while True:
+          try:
+            size, addr = self.sock.recvfrom_into(self.packet)
+          except BlockingIOError:
+            break
+          self.handle(size)
+
+  '''[handle]------------------------------------------------------------------
+    Copies the frames of one datagram into its ping's buffer
+  --------------------------------------------------------------------------'''
+  def handle(self, size):
+    if size < PACKET_HEADER.size:
+      self.bad += 1
+      return
+
+    magic, ping, channels, fmt, offset, total = \
+      PACKET_HEADER.unpack_from(self.packet_view)
+
+    if magic != PACKET_MAGIC or channels != self.channels or \
+       fmt >= len(self.payloads) or total > self.max_frames:
+      self.bad += 1
+      return
+
+    payload = self.payloads[fmt]
+    count = (size - PACKET_HEADER.size) // (payload.itemsize * channels)
+    count = min(count, total - offset) if offset < total else 0
+
+    #late datagrams of older pings must not cut the current one short
+    last = self.ping if self.ping is not None else self.done
+    if last is not None and (ping == self.done or ping_before(ping, last)):
+      self.stale += 1
+      return
+
+    if ping != self.ping:
+      self.finish()
+      self.start_ping(ping, total)
+
+    frames = payload[:count * channels].reshape(count, channels)
+    self.pool[self.slot, :, offset:offset + count] = frames.T
+    self.received += count
+
+    if self.received >= self.total:
+      self.finish()
+
+  '''[start_ping]--------------------------------------------------------------
+    Clears the next pool buffer for a new ping
+  --------------------------------------------------------------------------'''
+  def start_ping(self, ping, total):
+    self.slot = (self.slot + 1) % len(self.pool)
+    self.pool[self.slot, :, :total] = 0
+    self.ping = ping
+    self.total = total
+    self.received = 0
+
+  '''[finish]------------------------------------------------------------------
+    Hands the current ping to the processor
+  --------------------------------------------------------------------------'''
+  def finish(self):
+    if self.ping is None:
+      return
+
+    self.lost += max(self.total - self.received, 0)
+    self.pings += 1
+    self.processor.callback('GO', list(self.pool[self.slot, :, :self.total]))
+    self.done = self.ping
+    self.ping = None
+
+'''[ping_before]---------------------------------------------------------------
+  Whether ping number a comes before b, allowing for the 32 bit ping number
+  wrapping around
+----------------------------------------------------------------------------'''
+def ping_before(a, b):
+  return 0 < ((b - a) & 0xffffffff) < 0x80000000
+
+'''[sender_socket]-------------------------------------------------------------
+  Creates a socket for sending pings to a group from the interface at iface
+----------------------------------------------------------------------------'''
+def sender_socket(iface=MCAST_IFACE, ttl=1):
+  sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+  sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+  sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+  if iface != '0.0.0.0':
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(iface))
+  return sock
+
+'''[send_ping]-----------------------------------------------------------------
+  Sends one ping as datagrams of up to frames frames each.
+
+  sock    - socket from sender_socket
+  addr    - (group, port) to send to
+  ping    - ping number
+  samples - array of shape (channels, n)
+  fmt     - index into CAPTURE_FORMATS
+----------------------------------------------------------------------------'''
+def send_ping(sock, addr, ping, samples, fmt=0, frames=1024):
+  samples = np.asarray(samples)
+  channels, total = samples.shape
+  data = np.ascontiguousarray(samples.T, dtype=sonar_processor.CAPTURE_FORMATS[fmt])
+
+  for offset in range(0, total, frames):
+    header = PACKET_HEADER.pack(PACKET_MAGIC, ping, channels, fmt, offset, total)
+    sock.sendto(header + data[offset:offset + frames].tobytes(), addr)
@@ -0,0 +1,230 @@
+'''*-----------------------------------------------------------------------*---
+                                                          Date  : Oct 18 2026
+
+    File Name  : sonar_log.py
+    Description: Binary log of smoothed track states, written by a background
+                 thread so logging never blocks processing. Records have a
+                 fixed size and are kept in segments of bounded size, each
+                 with a sparse time index, so a replay can read any time
+                 range without scanning whole segments.
+
+                 <path>.0000.slog - LOG_HEADER followed by RECORD rows
+                 <path>.0000.sidx - INDEX rows, one every index_every records
+---*-----------------------------------------------------------------------*'''
+
+import collections
+import glob
+import os
+import struct
+import threading
+
+import numpy as np
+
+'''----------------------------------------------------------------------------
+Config variables
+----------------------------------------------------------------------------'''
+LOG_QUEUE = 64              #pings waiting to be written
+LOG_MAX_BYTES = 64 << 20    #segment size at which a new segment is started
+LOG_INDEX_EVERY = 256       #records between time index entries
+
+#segment header: magic, version, record size
+LOG_MAGIC = b'SLG1'
+LOG_VERSION = 2
+LOG_HEADER = struct.Struct('<4sHH')
+
+RECORD = np.dtype([('time', '<f8'), ('ping', '<u4'), ('track', '<u4'),
+                   ('x', '<f4'), ('y', '<f4'), ('z', '<f4'),
+                   ('vx', '<f4'), ('vy', '<f4'), ('vz', '<f4'),
+                   ('confidence', '<f4')])
+INDEX = np.dtype([('time', '<f8'), ('record', '<u8')])
+
+'''[sonar_log]-----------------------------------------------------------------
+  Writer thread for one log. log packs a ping's locations into records and
+  queues them, dropping the oldest queued ping when the queue is full, and
+  the thread appends them to the current segment.
+----------------------------------------------------------------------------'''
+class sonar_log(threading.Thread):
+  '''[__init__]----------------------------------------------------------------
+    Initializes and starts the writer. Segments continue numbering after
+    any already at path.
+
+    path        - base name of segment files
+    queue_size  - pings waiting to be written
+    max_bytes   - segment size at which a new segment is started
+    index_every - records between time index entries
+  --------------------------------------------------------------------------'''
+  def __init__(self, path, queue_size=LOG_QUEUE, max_bytes=LOG_MAX_BYTES,
+               index_every=LOG_INDEX_EVERY):
+    super(sonar_log, self).__init__()
+    self.daemon = True
+
+    self.path = path
+    self.queue_size = queue_size
+    self.max_bytes = max_bytes
+    self.index_every = index_every
+
+    #pending record batches, guarded by cond
+    self.cond = threading.Condition()
+    self.batches = collections.deque()
+    self.closing = False
+    self.dropped = 0
+
+    segments = list_segments(path)
+    self.seq = int(segments[-1].rsplit('.', 2)[-2]) + 1 if segments else 0
+    self.data = None
+    self.index = None
+
+    self.start()
+
+  '''[log]---------------------------------------------------------------------
+    Queues the track states of one ping. Never blocks.
+
+    stamp      - time of the ping, in s
+    ping       - ping number
+    tracks     - (K,) track ids
+    states     - (K, 6) array of locations and velocities
+    confidence - (K,) confidences
+  --------------------------------------------------------------------------'''
+  def log(self, stamp, ping, tracks, states, confidence):
+    records = np.empty(len(tracks), dtype=RECORD)
+    records['time'] = stamp
+    records['ping'] = ping
+    records['track'] = tracks
+    for col, field in enumerate(('x', 'y', 'z', 'vx', 'vy', 'vz')):
+      records[field] = states[:, col]
+    records['confidence'] = confidence
+
+    with self.cond:
+      if len(self.batches) >= self.queue_size:
+        self.batches.popleft()
+        self.dropped += 1
+      self.batches.append(records)
+      self.cond.notify_all()
+
+  '''[close]-------------------------------------------------------------------
+    Writes everything queued, then stops the writer and reports how many
+    pings were dropped because the queue was full
+
+    [return] - number of dropped pings
+  --------------------------------------------------------------------------'''
+  def close(self):
+    with self.cond:
+      self.closing = True
+      self.cond.notify_all()
+    self.join()
+
+    if self.dropped:
+      print('[sonar_log] Dropped {0} pings, the writer fell behind'.format(self.dropped))
+    return self.dropped
+
+  '''[run]---------------------------------------------------------------------
+    Writes queued batches until closed
+  --------------------------------------------------------------------------'''
+  def run(self):
+    while True:
+      with self.cond:
+        while not self.batches and not self.closing:
+          self.cond.wait()
+
+        if not self.batches:
+          break
+
+        batches = list(self.batches)
+        self.batches.clear()
+
+      for records in batches:
+        self.write(records)
+
+      self.data.flush()
+      self.index.flush()
+
+    if self.data is not None:
+      self.data.close()
+      self.index.close()
+
+  '''[write]-------------------------------------------------------------------
+    Appends records to the current segment, starting a new one first if it
+    is full, and indexes every index_every-th record.
+  --------------------------------------------------------------------------'''
+  def write(self, records):
+    if self.data is None or self.data.tell() >= self.max_bytes:
+      self.rotate()
+
+    first = (self.data.tell() - LOG_HEADER.size) // RECORD.itemsize
+    rows = np.arange(first, first + len(records))
+    marks = np.flatnonzero(rows % self.index_every == 0)
+
+    if len(marks):
+      index = np.empty(len(marks), dtype=INDEX)
+      index['time'] = records['time'][marks]
+      index['record'] = rows[marks]
+      self.index.write(index.tobytes())
+
+    self.data.write(records.tobytes())
+
+  '''[rotate]------------------------------------------------------------------
+    Closes the current segment and starts the next one
+  --------------------------------------------------------------------------'''
+  def rotate(self):
+    if self.data is not None:
+      self.data.close()
+      self.index.close()
+
+    name = '{0}.{1:04d}'.format(self.path, self.seq)
+    self.seq += 1
+
+    self.data = open(name + '.slog', 'wb')
+    self.index = open(name + '.sidx', 'wb')
+    self.data.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, RECORD.itemsize))
+
+'''[list_segments]-------------------------------------------------------------
+  Gets the segment files of a log, in order
+----------------------------------------------------------------------------'''
+def list_segments(path):
+  return sorted(glob.glob(glob.escape(path) + '.[0-9][0-9][0-9][0-9].slog'))
+
+'''[read_segment]--------------------------------------------------------------
+  Reads records of one segment between start and end times. The time index
+  narrows the read to the blocks that can hold them, and the records are
+  memory mapped, so nothing else is read.
+
+  [return] - array of RECORD rows
+----------------------------------------------------------------------------'''
+def read_segment(name, start, end):
+  with open(name, 'rb') as f:
+    magic, version, size = LOG_HEADER.unpack(f.read(LOG_HEADER.size))
+  if magic != LOG_MAGIC or size != RECORD.itemsize:
+    raise ValueError('not a sonar log segment: ' + name)
+  if version != LOG_VERSION:
+    raise ValueError('unsupported sonar log version {0}: {1}'.format(version, name))
+
+  count = (os.path.getsize(name) - LOG_HEADER.size) // RECORD.itemsize
+  if not count:
+    return np.zeros(0, dtype=RECORD)
+
+  index = np.fromfile(name[:-len('.slog')] + '.sidx', dtype=INDEX)
+  records = np.memmap(name, dtype=RECORD, mode='r', offset=LOG_HEADER.size,
+                      shape=(count,))
+
+  #blocks from the last entry before start to the first entry after end
+  low = 0
+  high = count
+  if len(index):
+    i = np.searchsorted(index['time'], start, 'left') - 1
+    j = np.searchsorted(index['time'], end, 'right')
+    low = int(index['record'][i]) if i >= 0 else 0
+    high = int(index['record'][j]) if j < len(index) else count
+
+  block = records[low:high]
+  times = block['time']
+  return np.array(block[np.searchsorted(times, start, 'left'):
+                        np.searchsorted(times, end, 'right')])
+
+'''[read_log]------------------------------------------------------------------
+  Reads all records of a log between start and end times, in seconds.
+
+  [return] - array of RECORD rows
+----------------------------------------------------------------------------'''
+def read_log(path, start=-np.inf, end=np.inf):
+  parts = [read_segment(name, start, end) for name in list_segments(path)]
+  return np.concatenate(parts) if parts else np.zeros(0, dtype=RECORD)
@@ -9,243 +9,505 @@
 import numpy as np
 import random
 import threading
+import concurrent.futures
+import itertools
 import time
+import collections
 import sensor_array
+import loc_index
+import sonar_log
+import sonar_profiler
+import sonar_trace
+import sonar_tracker
+import time_grid
+import argparse
+import importlib
+import struct
 import sys
-
-sys.path.insert(0, '../DistributedSharedMemory/build')
-sys.path.insert(0, '../PythonSharedBuffers/src')
-from ctypes import *
-from Vision import *
-from Constants import *
+import traceback
 
 '''----------------------------------------------------------------------------
 Config variables
 ----------------------------------------------------------------------------'''
 TOL_INT = 3
 TOL_OBJ = 0.25
-SPEED_WAVE = 1482
+SPEED_WAVE = sensor_array.SPEED_WAVE
+ENVELOPE_MODE = None        #power, analytic, rms, or None to profile raw samples
+DATA_FILE = 'data'
+PROFILE_CHUNK = 1 << 16
+WORKERS = 0                 #solver processes, 0 or 1 solves in this thread
+PARALLEL_MIN = 4096         #fewest candidates worth sending to workers
+ASSIGN_MODE = 'first_fit'   #first_fit or global, see spin
+TRACKING = False            #claim peaks of last ping's targets before search
+PING_PERIOD = 0.5           #seconds between pings
+SOLVER = 'ellipse'          #ellipse, grid, or lsq, see resolve
+SOLVERS = ('ellipse', 'grid', 'lsq')
+FIT_TOL = 2                 #largest grid or lsq solution residual, in samples
+GCC = False                 #prune candidates by cross correlating raw samples
+GCC_TOL = 2                 #largest miss of a correlated delay, in samples
+GCC_MIN_WEIGHT = 0.5        #weakest correlation trusted for pruning
+MATCHED = False             #matched filter samples before the profiler
+PING_FREQ = 40000           #default ping template tone, in Hz
+PING_LENGTH = 0.0004        #default ping template length, in s
+MATCHED_BLOCK = 4096        #matched filter FFT size
+LOG_FILE = 'sonar_log'      #base name of result log segments, None for no log
+VISION_PATHS = ['../DistributedSharedMemory/build', '../PythonSharedBuffers/src']
+RESULTS_BUFFER = 'sonar_results'  #DSM buffer locations are published to
+MAX_LOCATIONS = 100         #LocationArray length when Vision is not available
+SENSOR_LOCS = [[0, 0, 0], [-0.15, 0, 0], [0.25, 0, 0], [0, 0, 0.2]]
+SAMPLE_RATE = 200000
+QUEUE_SIZE = 4              #pings waiting to be processed
+QUEUE_POLICY = 'drop_oldest'
+QUEUE_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+#binary capture header: magic, channels, sample format, sample rate
+CAPTURE_MAGIC = b'SNR1'
+CAPTURE_HEADER = struct.Struct('<4sHHI')
+CAPTURE_FORMATS = [np.float32, np.int16]
 
 '''[sonar_processor]-----------------------------------------------------------
-  Processes set of times, doable in parallel with other sonar_processor threads
-  which allows for fast resolution on a large set of times.
+  Processes set of times. Candidate sets of times can be solved in parallel
+  by a pool of worker processes, which allows for fast resolution on a large
+  set of times.
 ----------------------------------------------------------------------------'''
 class sonar_processor(threading.Thread):
   '''[__init__]----------------------------------------------------------------
     Initializes sonar_processor to resolve times using a specified model.
+    workers sets how many processes solve candidates in parallel. queue_size
+    and queue_policy set how pings that arrive faster than they can be
+    solved are handled, see callback. tracking makes each ping reuse the
+    targets found on the previous one, see track. solver picks how sets of
+    times are solved, see resolve. sensors is the receiver array, by default
+    SENSOR_LOCS, and only the T layout can use the ellipse solver. gcc
+    prunes candidates against delays correlated from the raw samples of
+    each ping, see spin. matched runs samples through a matched filter for
+    the ping template before peaks are detected, see profiler. data_file is
+    read for GO jobs without samples, and log_path names the result log.
+    on_ping, when set, is called with the ping number and found locations
+    after every ping. envelope picks the sonar_envelope mode raw samples are
+    turned into before peaks are detected, see profiler.
   --------------------------------------------------------------------------'''
-  def __init__(self, model=[]):
+  def __init__(self, model=[], workers=WORKERS, queue_size=QUEUE_SIZE,
+               queue_policy=QUEUE_POLICY, tracking=TRACKING, solver=SOLVER,
+               sensors=None, gcc=GCC, matched=MATCHED, template=None,
+               data_file=DATA_FILE, log_path=LOG_FILE, envelope=ENVELOPE_MODE):
     super(sonar_processor, self).__init__()
+    if queue_policy not in QUEUE_POLICIES:
+      raise ValueError('unknown queue policy: ' + str(queue_policy))
+    if solver not in SOLVERS:
+      raise ValueError('unknown solver: ' + str(solver))
+
+    if sensors is None:
+      sensors = sensor_array.sensor_array.from_locs(SENSOR_LOCS, SAMPLE_RATE)
+    if solver == 'ellipse' and not sensors.tshape:
+      raise ValueError('ellipse solver needs the 4 receiver T layout')
+
     self.end_callback = False
-    self.go_callback = False
     self.daemon = True
 
+    #pending ping jobs, guarded by cond
+    self.cond = threading.Condition()
+    self.jobs = collections.deque()
+    self.busy = False
+    self.dropped = 0
+    self.failed = 0
+    self.queue_size = queue_size
+    self.queue_policy = queue_policy
+
     self.sim_locs = []
     self.found_locs = []
     self.times = []
     self.num_objs = 10
-    self.sensors = sensor_array.sensor_array(-0.15, 0.25, 0.2, 200000)
+    self.sensors = sensors
+    self.envelope = None
+    if envelope is not None:
+      self.envelope = sonar_profiler.sonar_envelope(envelope)
+    self.workers = workers
+    self.executor = None
+    self.assign_mode = ASSIGN_MODE
+    self.estimator = sonar_tracker.kalman_tracker()
+    self.ping_period = PING_PERIOD
+    self.stamp = None
+    self.tracker = None
+    if tracking:
+      self.tracker = sonar_tracker.ping_tracker(self.sensors)
+    self.matched = None
+    if matched:
+      if template is None:
+        template = sonar_profiler.ping_template(self.sensors.sample_rate,
+                                                PING_FREQ, PING_LENGTH)
+      self.matched = sonar_profiler.sonar_matched(template, MATCHED_BLOCK,
+                                                  len(self.sensors))
+    self.client = None
+    self.on_ping = None
+    self.data_file = data_file
+    self.log_path = log_path
+    self.log = None
+    self.pings = 0
+    self.results = None
+    self.samples = None
+    self.gcc = None
+    if gcc:
+      max_lag = int(np.ceil(self.sensors.max_dt[0].max() * self.sensors.sample_rate)) + 2
+      self.gcc = sonar_profiler.sonar_gcc(self.sensors.sample_rate, max_lag)
+    self.solver = solver
+    self.grid = None
+    if solver == 'grid':
+      self.grid = time_grid.load_or_build(self.sensors)
 
   '''[callback]----------------------------------------------------------------
-    Used for notifying this thread about certain events
+    Used for notifying this thread about certain events. A GO queues a ping
+    job, which is the raw samples of every receiver, or None to read them
+    from DATA_FILE, with stamp, the time of the ping in s. Live pings can
+    leave stamp as None to use the time they arrive. When the queue is full,
+    queue_policy decides whether the oldest job or the new one is dropped,
+    or whether the caller blocks.
   --------------------------------------------------------------------------'''
-  def callback(self, message):
-    if message == 'END':
-      self.end_callback = True
-      #print('[s_p] End callback received. Shutting down.')
+  def callback(self, message, data=None, stamp=None):
+    with self.cond:
+      if message == 'END':
+        self.end_callback = True
+        #print('[s_p] End callback received. Shutting down.')
+
+      if message == 'GO':
+        if self.queue_policy == 'block':
+          while len(self.jobs) >= self.queue_size and not self.end_callback:
+            self.cond.wait()
+
+        if len(self.jobs) >= self.queue_size:
+          self.dropped += 1
+          if self.queue_policy == 'drop_newest':
+            return
+          self.jobs.popleft()
 
-    if message == 'GO':
-      self.go_callback = True
+        self.jobs.append((data, time.time() if stamp is None else stamp))
+
+      self.cond.notify_all()
 
     print('[s_p] Callback received: ' + message)
 
+  '''[drain]-------------------------------------------------------------------
+    Blocks until all queued ping jobs are processed, or timeout seconds pass.
+    [return] - True if the queue drained
+  --------------------------------------------------------------------------'''
+  def drain(self, timeout=None):
+    with self.cond:
+      return self.cond.wait_for(lambda: not self.jobs and not self.busy,
+                                timeout)
+
   '''[spin]--------------------------------------------------------------------
-    Process latest data
+    Process latest data. With assign_mode first_fit, the first successful set
+    of times in search order claims its times. With global, every set is
+    solved and scored first, then sets are claimed best residual first, so
+    the result does not depend on search order.
   --------------------------------------------------------------------------'''
   def spin(self):
     print('[s_p] spinning')
     #read from the latest array of sonar times and process it
 
-    found = 0
     run_count = 0
-    found_locs = []
-    
-    self.num_objs = len(self.times)
+    found_locs = loc_index.loc_index(TOL_OBJ)
+    found_times = []
+
+    #peaks of known targets are claimed first, the rest are searched
+    search_times = self.times
+    if self.tracker is not None:
+      with sonar_trace.stage('track'):
+        search_times = self.track(found_locs, found_times)
+
+    #only physically possible sets of times, ordered by receiver 1 time
+    with sonar_trace.stage('candidates'):
+      cands, times = gen_candidates(search_times, self.sensors,
+                                    1 / self.sensors.sample_rate)
+
+      cand_times = np.column_stack([times[r][cands[:, r]] for r in range(len(times))])
+
+    #drop sets whose time differences disagree with strongly correlated delays
+    if self.gcc is not None and self.samples is not None:
+      with sonar_trace.stage('gcc'):
+        delay, weight = self.gcc.process(self.samples, times[0])
+        keep = gcc_prune(cands, cand_times, delay, weight,
+                         GCC_TOL / self.sensors.sample_rate, GCC_MIN_WEIGHT)
+
+        sonar_trace.count('gcc_pruned', len(cands) - int(keep.sum()))
+        cands = cands[keep]
+        cand_times = cand_times[keep]
+
+    with sonar_trace.stage('resolve'):
+      all_success, all_locs = self.resolve(cand_times)
+
+    with sonar_trace.stage('assign'):
+      if self.assign_mode == 'global':
+        #only sets whose times are all still available
+        valid = all_success & np.all(cand_times != 0, axis=1)
+        run_count = len(cands)
+
+        residuals = calc_residuals(cand_times[valid], all_locs[valid], self.sensors)
+        picks = assign_candidates(cands[valid], all_locs[valid], residuals,
+                                  found_locs)
+
+        found_times.extend(cand_times[valid][picks])
+
+        for r in range(len(times)):
+          times[r][cands[valid][picks][:, r]] = 0
+
+      else:
+        for c in range(len(cands)):
+          #make sure none of the times have already been removed
+          if any(times[r][cands[c][r]] == 0 for r in range(len(times))):
+            continue
+        
+          if self.end_callback:
+            return
 
-    #TODO fix this
-    time_tol_01 = (self.sensors.sensor_locs[1][0]) * -1 / SPEED_WAVE
-    time_tol_02 = (self.sensors.sensor_locs[2][0]) / SPEED_WAVE
-    time_tol_03 = (self.sensors.sensor_locs[3][2]) / SPEED_WAVE
+          run_count += 1
 
-    for obj1 in range(self.num_objs):
-      obj2 = 0
+          #keep non-duplicate locations and remove their times
+          if all_success[c] and found_locs.add(all_locs[c]):
+            found_times.append(cand_times[c])
+            for r in range(len(times)):
+              times[r][cands[c][r]] = 0
 
-      #start with valid obj2 times
-      while obj2 < self.num_objs and self.times[obj2][1] < self.times[obj1][0] - time_tol_01:
-        obj2 += 1
+            #print("Found: " + str(len(found_locs)))
 
-      for obj2 in range(obj2, self.num_objs):
-        obj3 = 0
-        
-        #start with valid obj3 times
-        while obj3 < self.num_objs and self.times[obj3][2] < self.times[obj1][0] - time_tol_02:
-          obj3 += 1
-        
-        for obj3 in range(obj3, self.num_objs):
-          obj4 = 0
-          
-          #start with valid obj4 times
-          while obj4 < self.num_objs and self.times[obj4][3] < self.times[obj1][0] - time_tol_03:
-            obj4 += 1
-
-          for obj4 in range(obj4, self.num_objs):
-            #make sure none of the times have already been removed
-            if self.times[obj1][0] == 0 or self.times[obj2][1] == 0 or self.times[obj3][2] == 0 or self.times[obj4][3] == 0:
-              continue
-            
-            if self.end_callback:
-              return
-
-            success, locs = resolve_t_array(self.times[obj1][0], self.times[obj2][1], self.times[obj3][2], self.times[obj4][3], self.sensors, TOL_INT, False)
-
-            run_count += 1
-            print('Runs: ' + str(run_count))
-
-            if success:
-              dup = False
-
-              for i in range(found):
-                if in_range(found_locs[i][0] - TOL_OBJ, found_locs[i][0] + TOL_OBJ, locs[0]) and \
-                   in_range(found_locs[i][1] - TOL_OBJ, found_locs[i][1] + TOL_OBJ, locs[1]) and \
-                   in_range(found_locs[i][2] - TOL_OBJ, found_locs[i][2] + TOL_OBJ, locs[2]):
-                  dup = True
-
-              if dup == False:
-                self.times[obj1][0] = 0
-                self.times[obj2][1] = 0
-                self.times[obj3][2] = 0
-                self.times[obj4][3] = 0
-                
-                found_locs.append(locs)
-
-                found += 1
-
-                #print("Found: " + str(found))
+    if sonar_trace.enabled:
+      sonar_trace.count('candidates', len(cands))
+      sonar_trace.count('runs', run_count)
+      sonar_trace.count('found', len(found_locs))
 
-    '''
-    for i in range(self.num_objs):
-      for j in range(4):
-        print("{0}\t".format(self.times[i][j]))
-    '''
+    self.times = times
+    self.found_locs = found_locs.locs
 
-    print(str(time_tol_01), str(time_tol_02), str(time_tol_03))
+    if self.tracker is not None:
+      self.tracker.update(self.found_locs, found_times)
 
-    print("Runs : " + str(run_count))
-    print("Found: " + str(found))
+  '''[track]-------------------------------------------------------------------
+    Claims peaks predicted for the targets of the last ping, and solves each
+    target whose peaks were all claimed.
 
-    self.found_locs = found_locs
+    found_locs  - loc_index that locations of tracked targets are added to
+    found_times - list that times of tracked targets are added to
+    [return]    - peak times left over for the full search
+  --------------------------------------------------------------------------'''
+  def track(self, found_locs, found_times):
+    claimed, times = self.tracker.claim(self.times)
+    claimed = claimed[np.all(claimed >= 0, axis=1)]
 
-  def read_times(self):
-    self.times = []
+    cand_times = np.column_stack([times[r][claimed[:, r]] for r in range(len(times))])
+    success, locs = self.resolve(cand_times)
+
+    for c in np.flatnonzero(success):
+      if found_locs.add(locs[c]):
+        found_times.append(cand_times[c])
+        for r in range(len(times)):
+          times[r][claimed[c][r]] = 0
 
-    with open('data', 'r') as f:
-      times = []
-      for line in f:
-        times.append(float(line))
+    if sonar_trace.enabled:
+      sonar_trace.count('tracked', len(found_locs))
 
-      for i in range(4):
-        self.times.append(times)
+    return [t[t != 0] for t in times]
 
-    print(self.times)
+  '''[resolve]-----------------------------------------------------------------
+    Solves (N, S) sets of times. The ellipse solver intersects the ellipsoids
+    of every set, in worker processes for large batches. The grid solver
+    looks sets up in the precomputed time grid and refines them, and the lsq
+    solver multilaterates them directly. Both reject sets no location
+    explains within FIT_TOL samples.
+
+    [return] - (N,) mask of successful resolutions, (N, 3) array of locations
+  --------------------------------------------------------------------------'''
+  def resolve(self, cand_times):
+    if self.solver == 'grid':
+      return self.grid.resolve(cand_times, FIT_TOL / self.sensors.sample_rate)
+
+    if self.solver == 'lsq':
+      return self.sensors.locate(cand_times, FIT_TOL / self.sensors.sample_rate)
+
+    if self.workers > 1 and len(cand_times) >= PARALLEL_MIN:
+      return resolve_parallel(self.get_executor(), cand_times, self.sensors,
+                              TOL_INT, self.workers)
+
+    return resolve_t_arrays(cand_times, self.sensors, TOL_INT)
+
+  '''[get_executor]------------------------------------------------------------
+    Starts the worker process pool on first use
+  --------------------------------------------------------------------------'''
+  def get_executor(self):
+    if self.executor is None:
+      self.executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+    return self.executor
+
+  '''[shutdown]----------------------------------------------------------------
+    Stops the worker process pool and writes out the result log
+  --------------------------------------------------------------------------'''
+  def shutdown(self):
+    if self.executor is not None:
+      self.executor.shutdown()
+      self.executor = None
+
+    if self.log is not None:
+      self.log.close()
+      self.log = None
+
+  '''[read_times]--------------------------------------------------------------
+    Reads raw samples of every receiver from a text, .npy, or binary capture
+    file. Binary files are memory mapped, so they are never fully loaded.
+  --------------------------------------------------------------------------'''
+  def read_times(self, path=DATA_FILE):
+    self.times = read_samples(path, len(self.sensors), self.sensors.sample_rate)
+
+    sonar_trace.count('samples', sum(len(rcvr) for rcvr in self.times))
 
   '''[run]---------------------------------------------------------------------
-    Runs when thread is started
+    Runs when thread is started. A ping that fails is reported and skipped,
+    so one bad ping neither stops the processor nor leaves drain waiting.
   --------------------------------------------------------------------------'''
   def run(self):
+    if self.log_path:
+      self.log = sonar_log.sonar_log(self.log_path)
+
     while True:
-      
-      if self.end_callback:
-        break;
+      with self.cond:
+        #wake up as soon as a ping or END arrives
+        while not self.jobs and not self.end_callback:
+          self.cond.wait()
+
+        if self.end_callback:
+          self.shutdown()
+          break;
+
+        job, stamp = self.jobs.popleft()
+        self.busy = True
+        self.cond.notify_all()
+
+      try:
+        self.process_ping(job, stamp)
+      except Exception:
+        self.failed += 1
+        print('[s_p] Ping failed')
+        traceback.print_exc()
+      finally:
+        with self.cond:
+          self.busy = False
+          self.cond.notify_all()
+
+  '''[process_ping]--------------------------------------------------------------
+    Locates targets in one ping job and publishes them
+  --------------------------------------------------------------------------'''
+  def process_ping(self, job, stamp):
+    print('[s_p] running')
 
-      while not self.go_callback:
-        time.sleep(0.1)
+    #self.gen_times()
 
-      self.go_callback = False
+    if job is None:
+      self.read_times(self.data_file)
+    else:
+      self.times = job
 
-      print('[s_p] running')
+    self.samples = self.times
+    self.times = self.profiler(self.times, self.sensors.sample_rate, 0.5)
 
-      #self.gen_times()
+    self.spin()
 
-      self.read_times()
+    #time since the last ping processed, which spans any dropped pings
+    dt = self.ping_period
+    if self.stamp is not None and stamp > self.stamp:
+      dt = stamp - self.stamp
+    self.stamp = stamp
 
-      self.times = self.profiler(self.times, 200000, 0.5)
+    with sonar_trace.stage('estimate'):
+      self.estimator.step(self.found_locs, dt)
 
-      self.spin()
+    self.pings += 1
+    self.write_DSM()
 
-      self.write_DSM()
+    if self.on_ping is not None:
+      self.on_ping(self.pings, self.found_locs)
 
-      #self.calc_acc()
+    #self.calc_acc()
 
   '''[profiler]----------------------------------------------------------------
     Extracts peaks and times from intensity over time profile for use in model.
+    With the matched filter, threshold applies to the correlation envelope,
+    peaks are timed at its maximum, and moved back by the filter delay.
+    Otherwise, with an envelope mode, threshold applies to the envelope of
+    the raw samples. The matched filter needs raw samples and its output is
+    already an envelope, so the envelope stage is skipped with it.
   --------------------------------------------------------------------------'''
-  def profiler(samples, sample_rate, threshold):
-    target_cooldown = 10
-    results = []
-
-    for rcvr_samples in samples:
-      result_row = []
-      for i in range(len(rcvr_samples)):
-        if rcvr_samples[i] >= threshold and target_cooldown == 0:
-          result_row.append(i / sample_rate)
-          target_cooldown = 10
-      
-        if target_cooldown != 0:
-          target_cooldown -= 1
-      results.append(result_row)
-    print(results)
+  def profiler(self, samples, sample_rate, threshold):
+    cooldown = 10
+    peak_window = 0
+    delay = 0
+    if self.matched is not None:
+      #the envelope of one echo stays up for about a template length, and its
+      #maximum is where the echo matches the template
+      self.matched.reset()
+      cooldown = max(cooldown, self.matched.taps)
+      peak_window = self.matched.taps
+      delay = self.matched.delay / sample_rate
+    elif self.envelope is not None:
+      self.envelope.reset()
+      #a moving average stays up for a whole window after every echo
+      if self.envelope.mode == 'rms':
+        cooldown = max(cooldown, self.envelope.window)
+
+    pf = sonar_profiler.sonar_profiler(sample_rate, threshold, cooldown,
+                                       len(samples), peak_window)
+    results = [[] for rcvr in range(len(samples))]
+    length = max(len(rcvr_samples) for rcvr_samples in samples)
+
+    #profile in chunks so memory mapped captures are never fully loaded
+    for start in range(0, length, PROFILE_CHUNK):
+      chunk = [rcvr_samples[start:start + PROFILE_CHUNK] for rcvr_samples in samples]
+      if self.matched is not None:
+        with sonar_trace.stage('matched'):
+          chunk = self.matched.process(chunk)
+      elif self.envelope is not None:
+        with sonar_trace.stage('envelope'):
+          chunk = self.preprocess_samples(chunk)
+
+      for rcvr, peaks in enumerate(pf.process(chunk)):
+        results[rcvr].extend(peaks - delay)
+
+    #output the filter still holds for echoes at the end of the ping
+    if self.matched is not None:
+      with sonar_trace.stage('matched'):
+        chunk = self.matched.flush()
+      for rcvr, peaks in enumerate(pf.process(chunk)):
+        results[rcvr].extend(peaks - delay)
+
+    for rcvr, peaks in enumerate(pf.flush()):
+      results[rcvr].extend(peaks - delay)
+
+    sonar_trace.count('peaks', sum(len(rcvr) for rcvr in results))
     return results
 
   '''[preprocess_samples]------------------------------------------------------
     Generates a power over time curve using a raw signal
   --------------------------------------------------------------------------'''
   def preprocess_samples(self, samples):
-    for i in range(len(samples)):
-      samples[i] = (samples[i] + cos(i))^2 + (samples[i] + sin(i))^2
-
-    return samples
+    return self.envelope.process(samples)
 
   '''[write_DSM]---------------------------------------------------------------
-    Writes found locs to DSM
+    Writes smoothed target states to DSM. States are packed into results,
+    whose memory has the LocationArray layout, with whole column
+    assignments. pydsm only takes buffer contents as bytes, so the client
+    gets one bytes copy of it.
   --------------------------------------------------------------------------'''
   def write_DSM(self):
     print('[s_p] Writing to DSM')
-    
-    with open("sonar_log", "a") as f:
-      for i in range(len(self.found_locs)):
-        f.write(self.found_locs[i][0], self.found_locs[i][1], self.found_locs[i][2], "\n")
-      f.write("hi\n")
-      
 
-    '''
-    all_locs = np.empty(len(self.found_locs), dtype=LocationArray)
+    est = self.estimator
+    confidence = est.confidence()
+    
+    if self.log is not None:
+      self.log.log(self.stamp, self.pings, est.ids, est.states, confidence)
 
-    for i in range(len(self.found_locs)):
-      l = Location()
+    pack_locations(self.get_results(), est.states[:, :3], confidence)
 
-      l.x = self.found_locs[i][0]
-      l.y = self.found_locs[i][1]
-      l.z = self.found_locs[i][2]
-      l.confidence = 1
-      l.loctype = 1
+    if self.client is not None:
+      self.client.setLocalBufferContents(RESULTS_BUFFER, self.results.tobytes())
 
-      all_locs[i] = l
-    
-    results = LocationArray()
-    results.locations = all_locs
-    setLocalBufferContents(sonar_results, results)
-    '''
-    
     '''
     temp, active = client.getRemoteBufferContents(bufnames, buflists, bufids)
     if active:
@@ -255,6 +517,15 @@ class sonar_processor(threading.Thread):
     
     '''
 
+  '''[get_results]-------------------------------------------------------------
+    Gets the packed LocationArray record results are published from,
+    creating it on first use so Vision is only loaded when needed
+  --------------------------------------------------------------------------'''
+  def get_results(self):
+    if self.results is None:
+      self.results = np.zeros((), dtype=location_dtypes()[1])
+    return self.results
+
   '''[gen_times]---------------------------------------------------------------
     Fills sim_locs up with random locations
   --------------------------------------------------------------------------'''
@@ -273,12 +544,10 @@ class sonar_processor(threading.Thread):
 
     
     
-    self.times = []
- 
-    #calc distances/times
+    #calc distances/times, stored per receiver like profiler output
+    obj_times = self.sensors.calc_times(self.sim_locs, False)
 
-    for i in range(self.num_objs):
-      self.times.append(calc_times(self.sim_locs[i], self.sensors, False, True))
+    self.times = [list(t) for t in obj_times.T]
 
   '''[calc_acc]----------------------------------------------------------------
     Calculate accuracy of simulation based on actual locs
@@ -297,6 +566,143 @@ class sonar_processor(threading.Thread):
       if i < len(self.found_locs):
         print(str(self.found_locs[i][0]), str(self.found_locs[i][1]), str(self.found_locs[i][2]))
       
+'''[load_vision]---------------------------------------------------------------
+  Imports the Vision shared buffer bindings from VISION_PATHS on first use,
+  so processors that never publish to DSM do not need them.
+
+  [return] - Vision module, or None if it is not available
+----------------------------------------------------------------------------'''
+def load_vision():
+  global vision
+  if vision is False:
+    for path in VISION_PATHS:
+      if path not in sys.path:
+        sys.path.append(path)
+    try:
+      vision = importlib.import_module('Vision')
+    except ImportError:
+      vision = None
+  return vision
+
+vision = False
+
+'''[location_dtypes]-----------------------------------------------------------
+  Gets numpy dtypes with the same memory layout as the Vision Location and
+  LocationArray ctypes structures, so packed results can be published as
+  they are. Falls back to the same fields with C alignment when Vision does
+  not define them.
+
+  [return] - Location dtype, LocationArray dtype
+----------------------------------------------------------------------------'''
+def location_dtypes():
+  module = load_vision()
+  if hasattr(module, 'LocationArray'):
+    return np.dtype(module.Location), np.dtype(module.LocationArray)
+
+  location = np.dtype([('x', np.float32), ('y', np.float32), ('z', np.float32),
+                       ('confidence', np.uint8), ('loctype', np.uint8)],
+                      align=True)
+  return location, np.dtype([('locations', location, (MAX_LOCATIONS,))],
+                            align=True)
+
+'''[pack_locations]------------------------------------------------------------
+  Fills a LocationArray record with locations, most confident first. Slots
+  past the last location are zeroed, and integer confidences are scaled to
+  the full range of their type.
+
+  results    - 0d array of a LocationArray dtype, filled in place
+  locs       - (K, 3) array of locations
+  confidence - (K,) confidences in [0, 1]
+----------------------------------------------------------------------------'''
+def pack_locations(results, locs, confidence):
+  slots = results['locations']
+  order = np.argsort(-confidence, kind='stable')[:len(slots)]
+  count = len(order)
+
+  slots['x'][:count] = locs[order, 0]
+  slots['y'][:count] = locs[order, 1]
+  slots['z'][:count] = locs[order, 2]
+
+  conf = confidence[order]
+  if slots['confidence'].dtype.kind in 'ui':
+    conf = np.round(conf * np.iinfo(slots['confidence'].dtype).max)
+  slots['confidence'][:count] = conf
+  slots['loctype'][:count] = 1
+
+  slots[count:] = np.zeros((), dtype=slots.dtype)
+
+'''[read_samples]--------------------------------------------------------------
+  Reads raw samples of every receiver from a file.
+
+  text     - one sample per line, shared by all receivers
+  .npy     - array of shape (n,) shared by all receivers, or (channels, n)
+  capture  - CAPTURE_HEADER followed by interleaved samples, see write_capture
+
+  path        - file to read
+  channels    - number of receivers, which multi channel files must match and
+                single channel files are shared by
+  sample_rate - samples per second the caller expects, checked against the
+                rate a capture was recorded at, or None to not check
+  [return]    - list of sample arrays, one per receiver. Binary files are
+                memory mapped and returned as views, so nothing is read until
+                used.
+----------------------------------------------------------------------------'''
+def read_samples(path, channels=len(SENSOR_LOCS), sample_rate=None):
+  with open(path, 'rb') as f:
+    head = f.read(CAPTURE_HEADER.size)
+
+  if head[:len(CAPTURE_MAGIC)] == CAPTURE_MAGIC:
+    if len(head) < CAPTURE_HEADER.size:
+      raise ValueError(path + ': capture header is truncated')
+
+    magic, count, fmt, rate = CAPTURE_HEADER.unpack(head)
+    if count != channels:
+      raise ValueError('{0}: captured {1} channels, expected {2}'.format(
+                       path, count, channels))
+    if fmt >= len(CAPTURE_FORMATS):
+      raise ValueError('{0}: unknown capture sample format {1}'.format(path, fmt))
+    if sample_rate is not None and rate != sample_rate:
+      raise ValueError('{0}: captured at {1} Hz, expected {2} Hz'.format(
+                       path, rate, sample_rate))
+
+    data = np.memmap(path, dtype=CAPTURE_FORMATS[fmt], mode='r',
+                     offset=CAPTURE_HEADER.size)
+    data = data[:len(data) - len(data) % channels].reshape(-1, channels)
+    return [data[:, rcvr] for rcvr in range(channels)]
+
+  if head[:6] == b'\x93NUMPY':
+    data = np.load(path, mmap_mode='r')
+    if data.ndim == 1:
+      return [data] * channels
+    if len(data) != channels:
+      raise ValueError('{0}: holds {1} channels, expected {2}'.format(
+                       path, len(data), channels))
+    return [data[rcvr] for rcvr in range(len(data))]
+
+  try:
+    with open(path, 'r') as f:
+      times = np.array([float(line) for line in f])
+  except (UnicodeDecodeError, ValueError):
+    raise ValueError('{0}: not a capture ({1!r} magic), .npy, or text sample '
+                     'file'.format(path, CAPTURE_MAGIC)) from None
+
+  return [times] * channels
+
+'''[write_capture]-------------------------------------------------------------
+  Writes raw samples of every receiver as a binary capture for read_samples.
+
+  path        - file to write
+  samples     - array of shape (channels, n)
+  sample_rate - samples per second of each channel
+  fmt         - index into CAPTURE_FORMATS
+----------------------------------------------------------------------------'''
+def write_capture(path, samples, sample_rate, fmt=0):
+  samples = np.asarray(samples)
+
+  with open(path, 'wb') as f:
+    f.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, len(samples), fmt, sample_rate))
+    f.write(np.ascontiguousarray(samples.T, dtype=CAPTURE_FORMATS[fmt]).tobytes())
+
 '''[calc_times]----------------------------------------------------------------
   Calculates times generated by an object placed at a certain loc.
 ----------------------------------------------------------------------------'''
@@ -305,7 +711,7 @@ def calc_times(obj_locs, sensors, exact, debug):
 
   dist_EO = pow(pow(obj_locs[0], 2) + pow(obj_locs[1], 2) + pow(obj_locs[2], 2), 0.5)
     
-  for i in range(4):
+  for i in range(len(sensors)):
     dist_OR = pow(pow(obj_locs[0] - sensors.sensor_locs[i][0], 2) + pow(obj_locs[1] - sensors.sensor_locs[i][1], 2) + pow(obj_locs[2] - sensors.sensor_locs[i][2], 2), 0.5)
     
     total_time = (dist_EO + dist_OR) / SPEED_WAVE
@@ -315,11 +721,116 @@ def calc_times(obj_locs, sensors, exact, debug):
     else:
       times.append(total_time - total_time % (1 / sensors.sample_rate) + (1 / sensors.sample_rate))
     
+  if sonar_trace.enabled:
+    sonar_trace.record('calc_times', obj_locs=list(obj_locs), times=times)
+
   if debug:
     print("Times: " + str(times))
     
   return times
 
+'''[gen_candidates]------------------------------------------------------------
+  Finds all physically possible sets of receiver times. Each receiver's times
+  are sorted once, then binary searched for the window of times reachable
+  from each receiver 1 time. Windows are bounded by the baselines between
+  receivers, since two arrival times of one echo can differ by at most the
+  distance between their receivers divided by the speed of sound. Sets are
+  grown one receiver at a time and pruned against every earlier receiver,
+  so extra receivers narrow the search instead of multiplying it.
+
+  times    - S lists of peak times, one per receiver
+  sensors  - sensor array containing positions of the receivers
+  slack    - extra time allowed on each window, e.g. 1 sample
+  [return] - (N, S) array of candidate indices into the sorted times,
+             list of S sorted time arrays
+----------------------------------------------------------------------------'''
+def gen_candidates(times, sensors, slack):
+  times = [np.sort(np.asarray(t, dtype=float)) for t in times]
+  max_dt = sensors.max_dt + slack
+
+  cands = np.arange(len(times[0]))[:, None]
+
+  for r in range(1, len(times)):
+    #window of valid times for receiver r around every receiver 1 time
+    t1 = times[0][cands[:, 0]]
+    low = np.searchsorted(times[r], t1 - max_dt[0][r], 'left')
+    high = np.searchsorted(times[r], t1 + max_dt[0][r], 'right')
+    counts = high - low
+
+    #every set extended by every time in its window, in order
+    starts = np.cumsum(counts) - counts
+    ext = np.arange(counts.sum()) - np.repeat(starts - low, counts)
+    cands = np.column_stack((np.repeat(cands, counts, axis=0), ext))
+
+    #receiver r must also be consistent with receivers 2 to r - 1
+    valid = np.ones(len(cands), dtype=bool)
+    for q in range(1, r):
+      valid &= np.abs(times[q][cands[:, q]] - times[r][cands[:, r]]) <= max_dt[q][r]
+    cands = cands[valid]
+
+  return cands.astype(int), times
+
+'''[gcc_prune]-----------------------------------------------------------------
+  Checks candidates against delays from sonar_gcc. A candidate survives if
+  every receiver's time difference from receiver 1 is within tol of the
+  delay correlated around its receiver 1 peak, or the correlation is weaker
+  than min_weight and so says nothing.
+
+  cands      - (N, S) array of indices into each receiver's sorted times
+  cand_times - (N, S) array of the times of cands
+  delay      - (P, S) delays for every sorted receiver 1 time
+  weight     - (P, S) correlation strengths of delay
+  [return]   - (N,) mask of candidates to keep
+----------------------------------------------------------------------------'''
+def gcc_prune(cands, cand_times, delay, weight, tol, min_weight):
+  diff = cand_times - cand_times[:, :1]
+  ok = (np.abs(diff - delay[cands[:, 0]]) <= tol) | \
+       (weight[cands[:, 0]] < min_weight)
+  return ok.all(axis=1)
+
+'''[calc_residuals]------------------------------------------------------------
+  Scores solved locations by how well they explain their receiver times.
+
+  times    - (N, S) array of receiver times
+  locs     - (N, 3) array of locations solved from times
+  sensors  - sensor array containing positions of the receivers
+  [return] - (N,) root sum square of differences between times and exact
+             times of locs, in seconds
+----------------------------------------------------------------------------'''
+def calc_residuals(times, locs, sensors):
+  diff = sensors.calc_times(locs, True) - times
+  return np.sqrt((diff ** 2).sum(axis=1))
+
+'''[assign_candidates]---------------------------------------------------------
+  Picks a consistent set of solved candidates with low total residual, by
+  claiming candidates in order of increasing residual. A candidate is skipped
+  if any of its times was already claimed or its location duplicates an
+  earlier pick.
+
+  cands     - (N, S) array of indices into each receiver's times
+  locs      - (N, 3) array of locations solved from cands
+  residuals - (N,) scores from calc_residuals
+  found     - loc_index that picked locations are added to
+  [return]  - indices of picked candidates
+----------------------------------------------------------------------------'''
+def assign_candidates(cands, locs, residuals, found):
+  rcvrs = range(cands.shape[1])
+  claimed = [set() for r in rcvrs]
+  picks = []
+
+  for c in np.argsort(residuals, kind='stable'):
+    if any(cands[c][r] in claimed[r] for r in rcvrs):
+      continue
+
+    if not found.add(locs[c]):
+      continue
+
+    for r in rcvrs:
+      claimed[r].add(cands[c][r])
+    picks.append(c)
+
+  return np.array(picks, dtype=int)
+
 '''[in_range]------------------------------------------------------------------
   Checks whether val is within low and high, inclusive.
   low  - low bound
@@ -336,18 +847,20 @@ Calculates X/Z intersect coordinates
 
 a        - variable
 b        - variable
+a2       - a ** 2
+a3       - a ** 3
 [return] - 2 element array containing possible X/Z locs
 ----------------------------------------------------------------------------'''
-def CEIntersect(a, b, c):
+def CEIntersect(a, b, c, a2, a3):
   intersects = np.zeros((2))
-  d = pow(a, 2) * c / b
+  d = a2 * c / b
 
   if d < 0:
     return intersects
 
   d = b * pow(d, 1/2)
-  intersects[0] = (pow(a, 3) - d - a * b) / pow(a, 2)
-  intersects[1] = (pow(a, 3) + d - a * b) / pow(a, 2)
+  intersects[0] = (a3 - d - a * b) / a2
+  intersects[1] = (a3 + d - a * b) / a2
   return intersects
 
 '''[resolve_t_array]-----------------------------------------------------------
@@ -360,8 +873,6 @@ def resolve_t_array(time1, time2, time3, time4, sensors, tol, debug):
   #draw ellipses for r1, r2, and r3 of form: (x+a)^2 / b^2 + y^2 / c^2 = 1
   #draw circle for E
   
-  if debug:
-    print('[res] called')
   A = 0
   B = 1
   C = 2
@@ -377,10 +888,6 @@ def resolve_t_array(time1, time2, time3, time4, sensors, tol, debug):
   #emitter radius squared
   r2 = pow(time1 * SPEED_WAVE / 2, 2)
 
-  rcvr[0][0] = sensors.sensor_locs[1][0]
-  rcvr[1][0] = sensors.sensor_locs[2][0]
-  rcvr[2][0] = sensors.sensor_locs[3][2]
-
   rcvr[0][1] = time2
   rcvr[1][1] = time3
   rcvr[2][1] = time4
@@ -388,12 +895,13 @@ def resolve_t_array(time1, time2, time3, time4, sensors, tol, debug):
 
   for ellipse in range(0, 3):
     #calculate x locs for EOE EO1
-    ei[ellipse][A] = rcvr[ellipse][0] / 2
+    ei[ellipse][A] = sensors.half[ellipse]
     ei[ellipse][B] = pow(rcvr[ellipse][1] * SPEED_WAVE / 2, 2)
-    ei[ellipse][C] = ei[ellipse][B] - pow(ei[ellipse][A], 2)
+    ei[ellipse][C] = ei[ellipse][B] - sensors.half2[ellipse]
 
     #calculate x locs of intersections
-    intersects = CEIntersect(ei[ellipse][A], ei[ellipse][B], r2)
+    intersects = CEIntersect(ei[ellipse][A], ei[ellipse][B], r2,
+                             sensors.half2[ellipse], sensors.half3[ellipse])
     tempIntersect[ellipse * 2][0] = intersects[0]
     tempIntersect[ellipse * 2 + 1][0] = intersects[1]
 
@@ -437,52 +945,197 @@ def resolve_t_array(time1, time2, time3, time4, sensors, tol, debug):
             result[2] = tempIntersect[i][0]
             success = True
  
-  #DEBUG
-  if debug:
-    print('+=[DEBUG]===============================+======================================+')
-    print('| resolveTArray      sonarSim 1.4       ', end = '')
-    print('| Data: {0:7.5f} {1:7.5f} {2:7.5f} {3:7.5f}\t|'.format(time1, 
-                                                                  time2, 
-                                                                  time3, 
-                                                                  time4))
-    for i in range(0, 3):
-      print('+-[Part{} EOE EO{}]-----------------------+--------------------------------------+'.format(i, i + 1))
-      print('|  ABC: {0:9.3f} {1:9.3f} {2:9.3f}\t|'.format(ei[i][A], 
-                                                          ei[i][B], 
-                                                          ei[i][C]), 
-                                                  end = '')
-      print(' XLocs: {0:9.2f} {1:9.2f}\t\t|'.format(tempIntersect[i * 2][0], 
-                                                  tempIntersect[i * 2 + 1][0]))
-      for j in range(i * 2, (i + 1) * 2):
-        if tempIntersect[j][0] == 0:
-          print('| - X{}: no solution\t\t\t|\t\t\t\t\t|'.format(j + 1))
-        elif tempIntersect[j][1] == 0:
-          print('| - Y{0:}: undef sqrt({1:18.3f})\t|\t\t\t\t\t|'.format(j + 1,
-                                                               ySqr[0][j % 2]))
-        else:
-          print('| + X{0:}: {1:8.3f}\t\t\t| Y{0:}: {2:8.3f}\t\t\t\t|'.format(j + 1,
-                                                          tempIntersect[j][0], 
-                                                          tempIntersect[j][1]))
-    print('+---------------------------------------+--------------------------------------+'.format(i, i + 1))
-    if found:
-      print('| +  X: {0:10.3f} Y: {1:10.3f}\t\t\t\t\t\t\t|'.format(result[0], 
-                                                               result[1]))
-      for i in range(0, 2):
-        if circY[i][0] < 0 or circY[i][1] < 0:
-          print('| - invalid Y1 or Y2\t\t\t\t\t\t\t\t|')
-        elif circY[i][0] == 0 and circY[i][1] == 0:
-          print('| - no Y\t\t\t\t\t\t\t\t\t|')
-        elif result[2] != 0:
-          print('| + Y1: {0:10.3f} Y2: {1:10.3f}\t> X: {2:8.3f} Y: {3:8.3f} Z:{4:8.3f}\t|'.format(
-                                                                   circY[i][0],
-                                                                   circY[i][1],
-                                                                   result[0],
-                                                                   result[1],
-                                                                   result[2]))
-        else:
-          print('| - Y1: {0:10.3f} Y2: {1:10.3f}\t\t\t\t\t\t|'.format(circY[i][0],
-                                                                  circY[i][1]))
-    print('+=======================================+======================================+\n')
+  if debug or sonar_trace.enabled:
+    trace = {'times': (time1, time2, time3, time4), 'ei': ei,
+             'tempIntersect': tempIntersect, 'ySqr': ySqr, 'circY': circY,
+             'result': result.copy(), 'found': found}
+    sonar_trace.record('resolve_t_array', **trace)
+
+    if debug:
+      print_resolve_trace(trace)
   
   return success, result
 
+'''[print_resolve_trace]-------------------------------------------------------
+  Prints a resolve_t_array trace record as a table.
+----------------------------------------------------------------------------'''
+def print_resolve_trace(trace, f=None):
+  def p(*args, **kwargs):
+    print(*args, file=f or sys.stdout, **kwargs)
+
+  A = 0
+  B = 1
+  C = 2
+  time1, time2, time3, time4 = trace['times']
+  ei            = trace['ei']
+  tempIntersect = trace['tempIntersect']
+  ySqr          = trace['ySqr']
+  circY         = trace['circY']
+  result        = trace['result']
+  found         = trace['found']
+
+  p('+=[DEBUG]===============================+======================================+')
+  p('| resolveTArray      sonarSim 1.4       ', end = '')
+  p('| Data: {0:7.5f} {1:7.5f} {2:7.5f} {3:7.5f}\t|'.format(time1, 
+                                                                time2, 
+                                                                time3, 
+                                                                time4))
+  for i in range(0, 3):
+    p('+-[Part{} EOE EO{}]-----------------------+--------------------------------------+'.format(i, i + 1))
+    p('|  ABC: {0:9.3f} {1:9.3f} {2:9.3f}\t|'.format(ei[i][A], 
+                                                        ei[i][B], 
+                                                        ei[i][C]), 
+                                                end = '')
+    p(' XLocs: {0:9.2f} {1:9.2f}\t\t|'.format(tempIntersect[i * 2][0], 
+                                                tempIntersect[i * 2 + 1][0]))
+    for j in range(i * 2, (i + 1) * 2):
+      if tempIntersect[j][0] == 0:
+        p('| - X{}: no solution\t\t\t|\t\t\t\t\t|'.format(j + 1))
+      elif tempIntersect[j][1] == 0:
+        p('| - Y{0:}: undef sqrt({1:18.3f})\t|\t\t\t\t\t|'.format(j + 1,
+                                                             ySqr[0][j % 2]))
+      else:
+        p('| + X{0:}: {1:8.3f}\t\t\t| Y{0:}: {2:8.3f}\t\t\t\t|'.format(j + 1,
+                                                        tempIntersect[j][0], 
+                                                        tempIntersect[j][1]))
+  p('+---------------------------------------+--------------------------------------+'.format(i, i + 1))
+  if found:
+    p('| +  X: {0:10.3f} Y: {1:10.3f}\t\t\t\t\t\t\t|'.format(result[0], 
+                                                             result[1]))
+    for i in range(0, 2):
+      if circY[i][0] < 0 or circY[i][1] < 0:
+        p('| - invalid Y1 or Y2\t\t\t\t\t\t\t\t|')
+      elif circY[i][0] == 0 and circY[i][1] == 0:
+        p('| - no Y\t\t\t\t\t\t\t\t\t|')
+      elif result[2] != 0:
+        p('| + Y1: {0:10.3f} Y2: {1:10.3f}\t> X: {2:8.3f} Y: {3:8.3f} Z:{4:8.3f}\t|'.format(
+                                                                 circY[i][0],
+                                                                 circY[i][1],
+                                                                 result[0],
+                                                                 result[1],
+                                                                 result[2]))
+      else:
+        p('| - Y1: {0:10.3f} Y2: {1:10.3f}\t\t\t\t\t\t|'.format(circY[i][0],
+                                                                circY[i][1]))
+  p('+=======================================+======================================+\n')
+
+sonar_trace.register_formatter('resolve_t_array', print_resolve_trace)
+
+'''[resolve_t_arrays]----------------------------------------------------------
+  Solves for locations given many sets of receiver times at once. Performs the
+  same steps as resolve_t_array, but on whole arrays.
+
+  times    - (N, 4) array of receiver 1-4 times
+  sensors  - sensor array containing positions of the receivers
+  tol      - tolerance for intersection distances
+  [return] - (N,) mask of successful resolutions, (N, 3) array of locations
+----------------------------------------------------------------------------'''
+def resolve_t_arrays(times, sensors, tol):
+  times = np.asarray(times, dtype=float).reshape(-1, 4)
+  num = len(times)
+
+  success = np.zeros(num, dtype=bool)
+  result  = np.zeros((num, 3))
+
+  with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+    #emitter radius squared
+    r2 = (times[:, 0] * SPEED_WAVE / 2) ** 2
+
+    #ellipse params for all 3 ellipses, shape (N, 3)
+    a  = sensors.half
+    a2 = sensors.half2
+    a3 = sensors.half3
+    b  = (times[:, 1:] * SPEED_WAVE / 2) ** 2
+
+    #circle ellipse intersections, x locs of shape (N, 3, 2)
+    d = a2 * r2[:, None] / b
+    no_sol = d < 0
+    d = b * d ** 0.5
+    xs = np.stack(((a3 - d - a * b) / a2,
+                   (a3 + d - a * b) / a2), axis=2)
+    xs[no_sol] = 0
+
+    #calculate y for any valid xs
+    ySqr = r2[:, None, None] - xs ** 2
+    ys = np.where((xs != 0) & (ySqr >= 0), ySqr ** 0.5, 0)
+
+    #try all 4 possible intersection points with tolerance against 3rd ellipse,
+    #last matching point wins as in resolve_t_array
+    match = (xs[:, 0, :, None] != 0) & \
+            (xs[:, 1, None, :] >= xs[:, 0, :, None] - tol) & \
+            (xs[:, 1, None, :] <= xs[:, 0, :, None] + tol)
+    match = match.any(axis=2)
+    found = match.any(axis=1)
+    pick = np.where(match[:, 1], 1, 0)
+
+    rows = np.arange(num)
+    result[found, 0] = xs[rows, 0, pick][found]
+    result[found, 1] = ys[rows, 0, pick][found]
+
+    #circle circle intersections in 3D space
+    for i in range(2):
+      x_i = xs[:, 2, i]
+      y_i = ys[:, 2, i]
+
+      circY0 = result[:, 1] ** 2 - x_i ** 2
+      circY1 = y_i ** 2 - result[:, 0] ** 2
+      valid = found & (y_i != 0) & (circY0 >= 0) & (circY1 >= 0)
+
+      circY0 = circY0 ** 0.5
+      circY1 = circY1 ** 0.5
+      hit = valid & (circY0 >= circY1 - tol) & (circY0 <= circY1 + tol)
+
+      result[hit, 1] = ((circY0 + circY1) / 2)[hit]
+      result[hit, 2] = x_i[hit]
+      success |= hit
+
+  if sonar_trace.enabled:
+    sonar_trace.record('resolve_t_arrays', times=times, xs=xs, ys=ys,
+                       success=success, result=result.copy())
+
+  return success, result
+
+'''[resolve_parallel]----------------------------------------------------------
+  Splits sets of receiver times into one partition per worker and solves them
+  with resolve_t_arrays in an executor. Results are in the same order as the
+  input, so they are identical to solving them all in this process.
+
+  executor - concurrent.futures executor to solve partitions with
+  times    - (N, 4) array of receiver 1-4 times
+  sensors  - sensor array containing positions of the receivers
+  tol      - tolerance for intersection distances
+  parts    - number of partitions
+  [return] - (N,) mask of successful resolutions, (N, 3) array of locations
+----------------------------------------------------------------------------'''
+def resolve_parallel(executor, times, sensors, tol, parts):
+  chunks = np.array_split(np.asarray(times, dtype=float).reshape(-1, 4), parts)
+  results = list(executor.map(resolve_t_arrays, chunks,
+                              itertools.repeat(sensors), itertools.repeat(tol)))
+
+  return np.concatenate([r[0] for r in results]), \
+         np.concatenate([r[1] for r in results])
+
+'''[main]----------------------------------------------------------------------
+  Processes a capture file as one ping and prints the locations found.
+----------------------------------------------------------------------------'''
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('data', nargs='?', default=DATA_FILE)
+  parser.add_argument('--solver', choices=SOLVERS, default=SOLVER)
+  parser.add_argument('--workers', type=int, default=WORKERS)
+  parser.add_argument('--log', default=LOG_FILE)
+  args = parser.parse_args()
+
+  s_p = sonar_processor(workers=args.workers, solver=args.solver,
+                        data_file=args.data, log_path=args.log)
+  s_p.start()
+  s_p.callback('GO')
+  s_p.drain()
+  s_p.callback('END')
+  s_p.join()
+
+  for loc in s_p.found_locs:
+    print('{0:8.3f} {1:8.3f} {2:8.3f}'.format(*loc))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,480 @@
+'''*-----------------------------------------------------------------------*---
+                                                          Date  : Oct 18 2026
+
+    File Name  : sonar_profiler.py
+    Description: Extracts peak times from hydrophone intensity profiles, either
+                 from whole recordings or from chunks as they arrive.
+---*-----------------------------------------------------------------------*'''
+
+import numpy as np
+
+'''[sonar_profiler]------------------------------------------------------------
+  Threshold crossing peak detector for a set of receiver channels. Each peak
+  starts a cooldown during which further crossings are suppressed, and its
+  time is interpolated between the samples around the crossing. With a
+  peak_window, the time is instead the interpolated maximum within that many
+  samples after the crossing, which does not move with echo strength. State
+  is kept between calls to process, so a stream can be fed in chunks of any
+  size and gives the same peaks as processing it all at once, followed by
+  flush.
+----------------------------------------------------------------------------'''
+class sonar_profiler():
+  '''[__init__]----------------------------------------------------------------
+    Initializes profiler for channels receivers.
+
+    sample_rate - samples per second of each channel
+    threshold   - intensity at which a peak is detected
+    cooldown    - samples after a peak during which no peak is detected
+    peak_window - samples after a crossing searched for the maximum, 0 to
+                  use the crossing
+  --------------------------------------------------------------------------'''
+  def __init__(self, sample_rate, threshold, cooldown=10, channels=4,
+               peak_window=0):
+    self.sample_rate = sample_rate
+    self.threshold = threshold
+    self.cooldown = cooldown
+    self.channels = channels
+    self.peak_window = peak_window
+    self.reset()
+
+  '''[reset]-------------------------------------------------------------------
+    Starts a new stream
+  --------------------------------------------------------------------------'''
+  def reset(self):
+    #samples seen so far, first sample a peak may be at, last sample seen
+    self.offset = np.zeros(self.channels, dtype=np.int64)
+    self.ready = np.zeros(self.channels, dtype=np.int64)
+    self.last = np.full(self.channels, np.nan)
+
+    #crossings still waiting for the rest of their peak window, and the
+    #samples before the current chunk that their windows cover
+    self.pending = [np.zeros(0, dtype=np.int64) for rcvr in range(self.channels)]
+    self.tail = [np.zeros(0) for rcvr in range(self.channels)]
+
+  '''[process]-----------------------------------------------------------------
+    Extracts peaks from the next chunk of samples of every channel.
+
+    samples  - one array of samples per channel
+    [return] - one array of peak times per channel, in seconds from the
+               start of the stream
+  --------------------------------------------------------------------------'''
+  def process(self, samples):
+    results = []
+
+    for rcvr in range(self.channels):
+      chunk = np.asarray(samples[rcvr], dtype=float)
+      peaks = self.find_peaks(rcvr, chunk)
+
+      if self.peak_window:
+        results.append(self.find_maxima(rcvr, chunk, peaks, False))
+        self.offset[rcvr] += len(chunk)
+        continue
+
+      #interpolate where the crossing happened between the previous sample
+      #and the peak sample, when the previous sample was below threshold
+      prev = np.empty(len(peaks))
+      prev[peaks > 0] = chunk[peaks[peaks > 0] - 1]
+      prev[peaks == 0] = self.last[rcvr]
+
+      with np.errstate(divide='ignore', invalid='ignore'):
+        frac = (self.threshold - prev) / (chunk[peaks] - prev)
+      frac = np.where(prev < self.threshold, frac, 1)
+
+      results.append((self.offset[rcvr] + peaks - 1 + frac) / self.sample_rate)
+
+      if len(chunk):
+        self.last[rcvr] = chunk[-1]
+      self.offset[rcvr] += len(chunk)
+
+    return results
+
+  '''[flush]-------------------------------------------------------------------
+    Ends a stream, returning peaks whose windows ran past its end
+  --------------------------------------------------------------------------'''
+  def flush(self):
+    empty = np.zeros(0)
+    return [self.find_maxima(rcvr, empty, np.zeros(0, dtype=np.int64), True)
+            for rcvr in range(self.channels)]
+
+  '''[find_maxima]-------------------------------------------------------------
+    Times peaks of one channel at the maximum within peak_window samples of
+    their crossings, interpolated with a parabola. Peaks whose windows do
+    not fit in what has been seen yet wait for the next chunk, unless final.
+  --------------------------------------------------------------------------'''
+  def find_maxima(self, rcvr, chunk, peaks, final):
+    w = self.peak_window
+    data = np.concatenate((self.tail[rcvr], chunk))
+    start = self.offset[rcvr] - len(self.tail[rcvr])
+    end = self.offset[rcvr] + len(chunk)
+
+    cross = np.concatenate((self.pending[rcvr], self.offset[rcvr] + peaks))
+    done = final | (cross + w + 1 <= end)
+    self.pending[rcvr] = cross[~done]
+    cross = cross[done]
+
+    #keep what pending windows and their left neighbours still need, and at
+    #least the last sample, the left neighbour of a maximum on the next one
+    keep = end - (self.pending[rcvr].min() - 1 if len(self.pending[rcvr]) else end)
+    keep = max(keep, 1)
+    self.tail[rcvr] = data[max(len(data) - keep, 0):]
+
+    if not len(cross):
+      return np.zeros(0)
+
+    idx = ((cross - start)[:, None] + np.arange(w)).clip(0, len(data) - 1)
+    best = idx[np.arange(len(cross)), np.argmax(data[idx], axis=1)]
+
+    mid = data[best]
+    left = data[(best - 1).clip(0, len(data) - 1)]
+    right = data[(best + 1).clip(0, len(data) - 1)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+      curve = left - 2 * mid + right
+      frac = np.where(curve < 0, (left - right) / (2 * curve), 0)
+
+    return (start + best + frac) / self.sample_rate
+
+  '''[find_peaks]--------------------------------------------------------------
+    Finds indices of peaks in a chunk of one channel, jumping over each
+    cooldown with a binary search instead of stepping through samples.
+  --------------------------------------------------------------------------'''
+  def find_peaks(self, rcvr, chunk):
+    above = np.flatnonzero(chunk >= self.threshold)
+    start = self.ready[rcvr] - self.offset[rcvr]
+    peaks = []
+
+    i = np.searchsorted(above, start)
+    while i < len(above):
+      peaks.append(above[i])
+      start = above[i] + self.cooldown
+      i = np.searchsorted(above, start, 'left')
+
+    self.ready[rcvr] = self.offset[rcvr] + start
+    return np.array(peaks, dtype=np.int64)
+
+'''[sonar_envelope]------------------------------------------------------------
+  Turns raw receiver signals into power over time curves for sonar_profiler.
+  Works in place on float arrays of shape (n,) or (channels, n), reusing its
+  scratch buffers between pings. Read-only input, such as a memory mapped
+  capture, is copied into a buffer of its own instead. Like the profiler it
+  keeps state between calls to process, so power and rms give the same curve
+  for a stream fed in chunks as for the whole stream. analytic transforms
+  each chunk on its own, which blurs the few samples at chunk edges.
+
+  power    - (s + cos(i))^2 + (s + sin(i))^2 for sample s at index i
+  analytic - squared magnitude of the analytic signal
+  rms      - mean of s^2 over the last window samples
+----------------------------------------------------------------------------'''
+class sonar_envelope():
+  MODES = ('power', 'analytic', 'rms')
+
+  '''[__init__]----------------------------------------------------------------
+    Initializes envelope stage with one of MODES. window is only used by rms.
+  --------------------------------------------------------------------------'''
+  def __init__(self, mode='power', window=16):
+    if mode not in self.MODES:
+      raise ValueError('unknown envelope mode: ' + str(mode))
+
+    self.mode = mode
+    self.window = window
+    self.cos = np.zeros(0)
+    self.sin = np.zeros(0)
+    self.scratch = np.zeros(0)
+    self.copy = np.zeros(0)
+    self.reset()
+
+  '''[reset]-------------------------------------------------------------------
+    Starts a new stream
+  --------------------------------------------------------------------------'''
+  def reset(self):
+    #samples seen so far, and the last window - 1 squared samples for rms
+    self.offset = 0
+    self.history = None
+
+  '''[buffers]-----------------------------------------------------------------
+    Grows the cached tables to cover the next n samples of the stream and the
+    scratch buffer to size elements
+  --------------------------------------------------------------------------'''
+  def buffers(self, n, size):
+    end = self.offset + n
+
+    if len(self.cos) < end:
+      i = np.arange(max(end, 2 * len(self.cos)))
+      self.cos = np.cos(i)
+      self.sin = np.sin(i)
+
+    if self.scratch.size < size:
+      self.scratch = np.empty(size)
+
+    return self.scratch[:size]
+
+  '''[process]-----------------------------------------------------------------
+    Replaces the next chunk of samples with their envelope.
+
+    samples  - float array of raw samples, overwritten with the envelope
+               unless it is read-only
+    [return] - samples, or the buffer read-only samples were copied to
+  --------------------------------------------------------------------------'''
+  def process(self, samples):
+    if not isinstance(samples, np.ndarray) or samples.dtype != np.float64:
+      samples = np.array(samples, dtype=float)
+    elif not samples.flags.writeable:
+      if self.copy.size < samples.size:
+        self.copy = np.empty(samples.size)
+      self.copy[:samples.size] = samples.ravel()
+      samples = self.copy[:samples.size].reshape(samples.shape)
+
+    n = samples.shape[-1]
+
+    if self.mode == 'power':
+      scratch = self.buffers(n, samples.size).reshape(samples.shape)
+      np.add(samples, self.cos[self.offset:self.offset + n], out=scratch)
+      np.square(scratch, out=scratch)
+      np.add(samples, self.sin[self.offset:self.offset + n], out=samples)
+      np.square(samples, out=samples)
+      samples += scratch
+
+    elif self.mode == 'analytic':
+      scratch = self.buffers(n, samples.size).reshape(samples.shape)
+      #zero negative frequencies and double positive ones
+      spectrum = np.fft.fft(samples, axis=-1)
+      h = np.zeros(n)
+      h[0] = 1
+      if n % 2 == 0:
+        h[n // 2] = 1
+        h[1:n // 2] = 2
+      else:
+        h[1:(n + 1) // 2] = 2
+      spectrum *= h
+      analytic = np.fft.ifft(spectrum, axis=-1)
+      np.square(analytic.real, out=samples)
+      np.square(analytic.imag, out=scratch)
+      samples += scratch
+
+    else:
+      w = self.window
+      if self.history is None:
+        self.history = np.zeros(samples.shape[:-1] + (0,))
+      h = self.history.shape[-1]
+
+      #running sums over the squared samples, after those kept from before
+      np.square(samples, out=samples)
+      full = np.concatenate((self.history, samples), axis=-1)
+      sums = self.buffers(n, full.size).reshape(full.shape)
+      np.cumsum(full, axis=-1, out=sums)
+
+      self.history = full[..., max(h + n - (w - 1), 0):]
+
+      #each sample averages the last w samples, fewer at the stream start
+      count = np.minimum(np.arange(self.offset + 1, self.offset + n + 1), w)
+      first = np.arange(h, h + n) - count
+      samples[...] = sums[..., h:]
+      samples[..., first >= 0] -= sums[..., first[first >= 0]]
+      samples /= count
+
+    self.offset += n
+    return samples
+
+'''[sonar_matched]-------------------------------------------------------------
+  Matched filter front end for sonar_profiler. Correlates every channel with
+  the emitted ping template by overlap-save FFT convolution on fixed size
+  blocks, keeping the last len(template) - 1 samples of each channel between
+  blocks. A quadrature copy of the template is correlated from the same
+  block spectrum, so the output is the envelope of the correlation, scaled so
+  an echo that matches the template with amplitude a peaks at a. Streams can
+  be fed in chunks of any size with constant memory and give the same output
+  as filtering them all at once, delayed by len(template) - 1 samples, which
+  flush returns at the end of a stream.
+----------------------------------------------------------------------------'''
+class sonar_matched():
+  '''[__init__]----------------------------------------------------------------
+    Initializes matched filter.
+
+    template - samples of the emitted ping
+    block    - FFT size, rounded up to a power of 2 of at least
+               2 * len(template)
+    channels - number of receivers
+  --------------------------------------------------------------------------'''
+  def __init__(self, template, block=4096, channels=4):
+    template = np.asarray(template, dtype=float)
+    self.taps = len(template)
+    self.nfft = 1 << int(np.ceil(np.log2(max(block, 2 * self.taps))))
+    self.step = self.nfft - self.taps + 1
+    self.channels = channels
+    self.delay = self.taps - 1
+
+    #reversed template and its quadrature, so convolution correlates
+    n = len(template)
+    spectrum = np.fft.fft(template)
+    h = np.zeros(n)
+    h[0] = 1
+    h[1:(n + 1) // 2] = 2
+    if n % 2 == 0:
+      h[n // 2] = 1
+    quad = np.fft.ifft(spectrum * h).imag
+    energy = max((template ** 2).sum(), 1e-12)
+
+    self.spec_i = np.fft.rfft(template[::-1] / energy, self.nfft)
+    self.spec_q = np.fft.rfft(quad[::-1] / energy, self.nfft)
+
+    self.block = np.zeros((channels, self.nfft))
+    self.reset()
+
+  '''[reset]-------------------------------------------------------------------
+    Starts a new stream
+  --------------------------------------------------------------------------'''
+  def reset(self):
+    self.history = np.zeros((self.channels, self.taps - 1))
+
+  '''[process]-----------------------------------------------------------------
+    Filters the next chunk of samples of every channel.
+
+    samples  - one array of samples per channel, all of the same length
+    [return] - (channels, n) array of the correlation envelope
+  --------------------------------------------------------------------------'''
+  def process(self, samples):
+    n = min(len(rcvr_samples) for rcvr_samples in samples)
+    out = np.empty((self.channels, n))
+    keep = self.taps - 1
+
+    for start in range(0, n, self.step):
+      m = min(self.step, n - start)
+
+      self.block[:, :keep] = self.history
+      for rcvr in range(self.channels):
+        self.block[rcvr, keep:keep + m] = samples[rcvr][start:start + m]
+      self.block[:, keep + m:] = 0
+
+      spectrum = np.fft.rfft(self.block, axis=-1)
+      i = np.fft.irfft(spectrum * self.spec_i, self.nfft, axis=-1)[:, keep:keep + m]
+      q = np.fft.irfft(spectrum * self.spec_q, self.nfft, axis=-1)[:, keep:keep + m]
+      np.hypot(i, q, out=out[:, start:start + m])
+
+      self.history[:] = self.block[:, m:m + keep]
+
+    return out
+
+  '''[flush]-------------------------------------------------------------------
+    Ends a stream, returning the last len(template) - 1 samples of output,
+    which hold echoes that started in the final samples fed in
+  --------------------------------------------------------------------------'''
+  def flush(self):
+    out = self.process(np.zeros((self.channels, self.taps - 1)))
+    self.reset()
+    return out
+
+'''[ping_template]-------------------------------------------------------------
+  Builds a Hann windowed tone burst, the default ping template.
+
+  sample_rate - samples per second
+  freq        - tone frequency, in Hz
+  length      - burst length, in s
+----------------------------------------------------------------------------'''
+def ping_template(sample_rate, freq, length):
+  t = np.arange(max(int(round(length * sample_rate)), 1)) / sample_rate
+  return np.hanning(len(t)) * np.sin(2 * np.pi * freq * t)
+
+'''[sonar_gcc]-----------------------------------------------------------------
+  Generalized cross correlation with phase transform (GCC-PHAT) between the
+  reference receiver and every other receiver, around each reference peak.
+  Whitening the cross spectrum leaves a sharp correlation peak whose
+  position, interpolated with a parabola, gives the delay to a fraction of a
+  sample. Its height, normalized to [0, 1], says how much the two windows
+  share one delayed echo. Full whitening (beta = 1) also amplifies bins that
+  hold only noise, so bins are divided by |cross| ** beta with beta < 1.
+  Windows of all peaks are transformed as one batch, and the window buffer
+  and lag tables are kept between pings.
+----------------------------------------------------------------------------'''
+class sonar_gcc():
+  '''[__init__]----------------------------------------------------------------
+    Initializes cross correlation stage.
+
+    sample_rate - samples per second of each channel
+    max_lag     - largest delay searched, in samples
+    window      - samples correlated around each peak, at least 2 * max_lag
+    beta        - how strongly the cross spectrum is whitened, 0 to 1
+  --------------------------------------------------------------------------'''
+  def __init__(self, sample_rate, max_lag, window=128, beta=0.7):
+    self.sample_rate = sample_rate
+    self.beta = beta
+    self.max_lag = int(max_lag)
+    self.window = max(int(window), 2 * self.max_lag + 2)
+    self.nfft = 2 * self.window
+
+    #correlation indices of lags -max_lag to max_lag, with 1 extra on each
+    #side for interpolation
+    lags = np.arange(-self.max_lag - 1, self.max_lag + 2)
+    self.lag_idx = lags % self.nfft
+    self.span = np.arange(self.window)
+    self.scratch = np.zeros(0)
+
+  '''[buffers]-----------------------------------------------------------------
+    Grows the window buffer to fit channels * num windows
+  --------------------------------------------------------------------------'''
+  def buffers(self, channels, num):
+    size = channels * num * self.window
+    if self.scratch.size < size:
+      self.scratch = np.empty(size)
+    return self.scratch[:size].reshape(channels, num, self.window)
+
+  '''[process]-----------------------------------------------------------------
+    Cross correlates windows starting max_lag samples before each reference
+    peak.
+
+    samples   - one array of raw samples per channel, channel 0 is the
+                reference. Only the windows are read, so memory mapped
+                captures are fine.
+    ref_times - (P,) reference peak times, in seconds from the first sample
+    [return]  - (P, S) delays of every channel behind the reference, in s,
+                (P, S) correlation strengths in [0, 1], with column 0 being
+                the reference itself
+  --------------------------------------------------------------------------'''
+  def process(self, samples, ref_times):
+    ref_times = np.asarray(ref_times, dtype=float).reshape(-1)
+    channels = len(samples)
+    n = min(len(rcvr_samples) for rcvr_samples in samples)
+
+    delay = np.zeros((len(ref_times), channels))
+    weight = np.ones((len(ref_times), channels))
+    if not len(ref_times) or not n:
+      return delay, weight
+
+    start = np.round(ref_times * self.sample_rate).astype(np.int64) - self.max_lag
+    idx = (start[:, None] + self.span).clip(0, n - 1)
+    windows = self.buffers(channels, len(ref_times))
+    for rcvr in range(channels):
+      windows[rcvr] = np.asarray(samples[rcvr])[idx]
+
+    #whitened cross spectrum of every channel against the reference
+    spectra = np.fft.rfft(windows, self.nfft, axis=-1)
+    cross = spectra * spectra[0].conj()
+    mag = np.maximum(np.abs(cross), 1e-12)
+    cross /= mag ** self.beta
+    corr = np.fft.irfft(cross, self.nfft, axis=-1)[..., self.lag_idx]
+
+    #largest value the correlation could reach if every bin lined up
+    mag **= 1 - self.beta
+    bound = 2 * mag.sum(axis=-1) - mag[..., 0] - mag[..., -1]
+    corr /= np.maximum(bound, 1e-12)[..., None] / self.nfft
+
+    #strongest lag, skipping the interpolation margins
+    peak = np.argmax(corr[..., 1:-1], axis=-1) + 1
+    mid = np.take_along_axis(corr, peak[..., None], -1)[..., 0]
+    left = np.take_along_axis(corr, peak[..., None] - 1, -1)[..., 0]
+    right = np.take_along_axis(corr, peak[..., None] + 1, -1)[..., 0]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+      curve = left - 2 * mid + right
+      frac = np.where(curve < 0, (left - right) / (2 * curve), 0)
+
+    lag = peak - self.max_lag - 1 + frac
+    delay[:] = (lag / self.sample_rate).T
+    weight[:] = mid.clip(0, 1).T
+
+    return delay, weight
+
+'''[profile]-------------------------------------------------------------------
+  Extracts peak times from whole recordings of every channel.
+----------------------------------------------------------------------------'''
+def profile(samples, sample_rate, threshold, cooldown=10):
+  pf = sonar_profiler(sample_rate, threshold, cooldown, len(samples))
+  return pf.process(samples)
@@ -0,0 +1,130 @@
+'''*-----------------------------------------------------------------------*---
+                                                          Date  : Oct 18 2026
+
+    File Name  : sonar_trace.py
+    Description: Counters, per-stage timers, and a ring buffer of solver
+                 internals, which replace inline debug prints. Everything is
+                 off by default and costs one attribute check when disabled:
+
+                   if sonar_trace.enabled:
+                     sonar_trace.record('resolve_t_array', ei=ei)
+
+                 Call dump() to print what was collected.
+---*-----------------------------------------------------------------------*'''
+
+import collections
+import sys
+import time
+
+'''----------------------------------------------------------------------------
+Config variables
+----------------------------------------------------------------------------'''
+RING_SIZE = 256
+
+enabled = False
+counters = collections.Counter()
+timers = collections.defaultdict(float)
+ring = collections.deque(maxlen=RING_SIZE)
+formatters = {}
+
+'''[null_stage]----------------------------------------------------------------
+  Stage timer used while tracing is disabled, does nothing.
+----------------------------------------------------------------------------'''
+class null_stage():
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    return False
+
+'''[stage_timer]---------------------------------------------------------------
+  Adds the time spent inside a with block to timers[name].
+----------------------------------------------------------------------------'''
+class stage_timer():
+  def __init__(self, name):
+    self.name = name
+
+  def __enter__(self):
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc):
+    timers[self.name] += time.perf_counter() - self.start
+    counters[self.name + '_calls'] += 1
+    return False
+
+NULL_STAGE = null_stage()
+
+'''[enable]--------------------------------------------------------------------
+  Turns tracing on, keeping the last ring_size records
+----------------------------------------------------------------------------'''
+def enable(ring_size=RING_SIZE):
+  global enabled, ring
+  if ring.maxlen != ring_size:
+    ring = collections.deque(ring, maxlen=ring_size)
+  enabled = True
+
+'''[disable]-------------------------------------------------------------------
+  Turns tracing off, keeping what was collected
+----------------------------------------------------------------------------'''
+def disable():
+  global enabled
+  enabled = False
+
+'''[reset]---------------------------------------------------------------------
+  Clears everything collected
+----------------------------------------------------------------------------'''
+def reset():
+  counters.clear()
+  timers.clear()
+  ring.clear()
+
+'''[count]---------------------------------------------------------------------
+  Adds n to a counter
+----------------------------------------------------------------------------'''
+def count(name, n=1):
+  if enabled:
+    counters[name] += n
+
+'''[stage]---------------------------------------------------------------------
+  Times a with block under name:
+
+    with sonar_trace.stage('spin'):
+      ...
+----------------------------------------------------------------------------'''
+def stage(name):
+  if enabled:
+    return stage_timer(name)
+  return NULL_STAGE
+
+'''[record]--------------------------------------------------------------------
+  Adds a record of kind with data to the ring buffer. Arrays are stored as
+  given, so callers should pass copies of anything they reuse.
+----------------------------------------------------------------------------'''
+def record(kind, **data):
+  if enabled:
+    ring.append((time.perf_counter(), kind, data))
+
+'''[register_formatter]--------------------------------------------------------
+  Sets how dump prints records of kind. fn takes the record data and a file.
+----------------------------------------------------------------------------'''
+def register_formatter(kind, fn):
+  formatters[kind] = fn
+
+'''[dump]----------------------------------------------------------------------
+  Prints counters, timers, and the ring buffer
+----------------------------------------------------------------------------'''
+def dump(f=None):
+  f = f or sys.stdout
+  print('+=[TRACE]=====================================================+', file=f)
+  for name in sorted(counters):
+    print('| {0:<30} {1:>12}'.format(name, counters[name]), file=f)
+  for name in sorted(timers):
+    print('| {0:<30} {1:>12.3f} ms'.format(name, timers[name] * 1000), file=f)
+  print('+-[{0} records]'.format(len(ring)).ljust(63, '-') + '+', file=f)
+
+  for stamp, kind, data in ring:
+    if kind in formatters:
+      formatters[kind](data, f)
+    else:
+      print('{0:.6f} {1} {2}'.format(stamp, kind, data), file=f)
@@ -0,0 +1,252 @@
+'''*-----------------------------------------------------------------------*---
+                                                          Date  : Oct 18 2026
+
+    File Name  : sonar_tracker.py
+    Description: Tracks targets between pings, so peaks belonging to already
+                 known targets can be claimed without a combinatorial search,
+                 and filters found locations into smoothed target states.
+---*-----------------------------------------------------------------------*'''
+
+import numpy as np
+
+'''----------------------------------------------------------------------------
+Config variables
+----------------------------------------------------------------------------'''
+TRACK_GATE = 0.0005         #furthest a peak can be from its prediction, in s
+
+KF_MEAS_STD = 0.5           #standard deviation of found locations, in m
+KF_ACCEL_STD = 0.5          #standard deviation of target acceleration, in m/s^2
+KF_INIT_VEL_STD = 2         #standard deviation of a new track's velocity, in m/s
+KF_GATE_DIST = 3            #furthest a location can be from its track, in m
+KF_MAX_MISSES = 3           #pings a track survives without being found
+KF_CONFIRM_HITS = 3         #pings for confidence to reach 1 - 1/e
+KF_MISS_DECAY = 0.5         #confidence multiplier for every missed ping
+
+'''[ping_tracker]--------------------------------------------------------------
+  Predicts the receiver times of every known target for the next ping and
+  claims the closest peak within gate on each receiver. Targets are the
+  locations found on the previous ping. Solved locations are not exact, so
+  each target also keeps the difference between its measured times and the
+  times calculated from its location, which corrects its predictions.
+----------------------------------------------------------------------------'''
+class ping_tracker():
+  '''[__init__]----------------------------------------------------------------
+    Initializes tracker with no known targets
+  --------------------------------------------------------------------------'''
+  def __init__(self, sensors, gate=TRACK_GATE):
+    self.sensors = sensors
+    self.gate = gate
+    self.reset()
+
+  '''[claim]-------------------------------------------------------------------
+    Claims peaks for known targets. When two targets want the same peak, the
+    one predicted closest to it gets it.
+
+    times    - S lists of peak times, one per receiver
+    [return] - (K, S) array of claimed indices into the sorted times for each
+               target, -1 where nothing was claimed, list of S sorted time
+               arrays
+  --------------------------------------------------------------------------'''
+  def claim(self, times):
+    times = [np.sort(np.asarray(t, dtype=float)) for t in times]
+    claimed = np.full((len(self.targets), len(times)), -1, dtype=int)
+
+    if not len(self.targets):
+      return claimed, times
+
+    predicted = self.sensors.calc_times(self.targets, True) + self.offsets
+
+    for rcvr in range(len(times)):
+      peaks = times[rcvr]
+      if not len(peaks):
+        continue
+
+      #closest peak on either side of every prediction
+      right = np.searchsorted(peaks, predicted[:, rcvr]).clip(0, len(peaks) - 1)
+      left = (right - 1).clip(0, len(peaks) - 1)
+      use_left = np.abs(peaks[left] - predicted[:, rcvr]) < \
+                 np.abs(peaks[right] - predicted[:, rcvr])
+      nearest = np.where(use_left, left, right)
+      dist = np.abs(peaks[nearest] - predicted[:, rcvr])
+
+      taken = set()
+      for target in np.argsort(dist, kind='stable'):
+        if dist[target] > self.gate:
+          break
+        if nearest[target] in taken:
+          continue
+        taken.add(nearest[target])
+        claimed[target][rcvr] = nearest[target]
+
+    return claimed, times
+
+  '''[update]------------------------------------------------------------------
+    Sets the known targets to the locations found on this ping
+
+    locs  - (K, 3) array of found locations
+    times - (K, S) array of the receiver times each location was solved from
+  --------------------------------------------------------------------------'''
+  def update(self, locs, times):
+    self.targets = np.asarray(locs, dtype=float).reshape(-1, 3)
+    self.offsets = np.asarray(times, dtype=float).reshape(-1, len(self.sensors)) - \
+                   self.sensors.calc_times(self.targets, True)
+
+  '''[reset]-------------------------------------------------------------------
+    Forgets all known targets
+  --------------------------------------------------------------------------'''
+  def reset(self):
+    self.targets = np.zeros((0, 3))
+    self.offsets = np.zeros((0, len(self.sensors)))
+
+'''[kalman_tracker]------------------------------------------------------------
+  Constant velocity Kalman filter over many targets, each kept under a track
+  id across pings. All track states live in arrays, and found locations are
+  associated through a voxel grid, so a ping costs O(targets).
+
+    states  - (K, 6) x, y, z, vx, vy, vz of every track
+    covs    - (K, 6, 6) state covariances
+    ids     - (K,) track ids
+    hits    - (K,) pings each track was associated on
+    misses  - (K,) pings since each track was last associated
+----------------------------------------------------------------------------'''
+class kalman_tracker():
+  '''[__init__]----------------------------------------------------------------
+    Initializes tracker with no tracks.
+
+    meas_std   - standard deviation of found locations, in m
+    accel_std  - standard deviation of target acceleration, in m/s^2
+    gate_dist  - furthest a location can be from a predicted track, in m
+    max_misses - pings a track survives without an associated location
+  --------------------------------------------------------------------------'''
+  def __init__(self, meas_std=KF_MEAS_STD, accel_std=KF_ACCEL_STD,
+               gate_dist=KF_GATE_DIST, max_misses=KF_MAX_MISSES):
+    self.meas_std = meas_std
+    self.accel_std = accel_std
+    self.gate_dist = gate_dist
+    self.max_misses = max_misses
+    self.next_id = 0
+    self.reset()
+
+  '''[reset]-------------------------------------------------------------------
+    Drops all tracks
+  --------------------------------------------------------------------------'''
+  def reset(self):
+    self.states = np.zeros((0, 6))
+    self.covs = np.zeros((0, 6, 6))
+    self.ids = np.zeros(0, dtype=np.int64)
+    self.hits = np.zeros(0, dtype=np.int64)
+    self.misses = np.zeros(0, dtype=np.int64)
+
+  '''[predict]-----------------------------------------------------------------
+    Moves every track dt seconds forward
+  --------------------------------------------------------------------------'''
+  def predict(self, dt):
+    F = np.eye(6)
+    F[:3, 3:] = np.eye(3) * dt
+
+    q = self.accel_std ** 2
+    Q = np.zeros((6, 6))
+    Q[:3, :3] = np.eye(3) * q * dt ** 4 / 4
+    Q[:3, 3:] = np.eye(3) * q * dt ** 3 / 2
+    Q[3:, :3] = np.eye(3) * q * dt ** 3 / 2
+    Q[3:, 3:] = np.eye(3) * q * dt ** 2
+
+    self.states = self.states @ F.T
+    self.covs = F @ self.covs @ F.T + Q
+
+  '''[associate]---------------------------------------------------------------
+    Pairs tracks with found locations, closest pairs first. Locations are
+    hashed into voxels of gate_dist, so each track only checks the 27 voxels
+    around its predicted position.
+
+    [return] - (P,) track indices, (P,) location indices
+  --------------------------------------------------------------------------'''
+  def associate(self, locs):
+    voxels = {}
+    for j, key in enumerate(map(tuple, np.floor(locs / self.gate_dist).astype(int))):
+      voxels.setdefault(key, []).append(j)
+
+    pairs = []
+    keys = np.floor(self.states[:, :3] / self.gate_dist).astype(int)
+    for i in range(len(self.states)):
+      vx, vy, vz = keys[i]
+      for x in range(vx - 1, vx + 2):
+        for y in range(vy - 1, vy + 2):
+          for z in range(vz - 1, vz + 2):
+            for j in voxels.get((x, y, z), ()):
+              dist = np.linalg.norm(locs[j] - self.states[i, :3])
+              if dist <= self.gate_dist:
+                pairs.append((dist, i, j))
+
+    pairs.sort()
+    used_tracks = set()
+    used_locs = set()
+    tracks = []
+    matched = []
+    for dist, i, j in pairs:
+      if i in used_tracks or j in used_locs:
+        continue
+      used_tracks.add(i)
+      used_locs.add(j)
+      tracks.append(i)
+      matched.append(j)
+
+    return np.array(tracks, dtype=int), np.array(matched, dtype=int)
+
+  '''[step]--------------------------------------------------------------------
+    Updates tracks with the locations found on one ping. Unassociated
+    locations start new tracks, and tracks missed for more than max_misses
+    pings are dropped.
+
+    locs - (M, 3) array of found locations
+    dt   - seconds since the last ping
+  --------------------------------------------------------------------------'''
+  def step(self, locs, dt):
+    locs = np.asarray(locs, dtype=float).reshape(-1, 3)
+
+    self.predict(dt)
+    tracks, matched = self.associate(locs)
+
+    #batched Kalman update of associated tracks, H picks out the position
+    if len(tracks):
+      P = self.covs[tracks]
+      S = P[:, :3, :3] + np.eye(3) * self.meas_std ** 2
+      K = P[:, :, :3] @ np.linalg.inv(S)
+      y = locs[matched] - self.states[tracks, :3]
+
+      self.states[tracks] += np.einsum('kij,kj->ki', K, y)
+      self.covs[tracks] = P - K @ P[:, :3, :]
+
+    self.misses += 1
+    self.misses[tracks] = 0
+    self.hits[tracks] += 1
+
+    keep = self.misses <= self.max_misses
+    self.states = self.states[keep]
+    self.covs = self.covs[keep]
+    self.ids = self.ids[keep]
+    self.hits = self.hits[keep]
+    self.misses = self.misses[keep]
+
+    #start tracks for new locations
+    new = np.setdiff1d(np.arange(len(locs)), matched)
+    if len(new):
+      cov = np.zeros((len(new), 6, 6))
+      cov[:, :3, :3] = np.eye(3) * self.meas_std ** 2
+      cov[:, 3:, 3:] = np.eye(3) * KF_INIT_VEL_STD ** 2
+
+      self.states = np.concatenate((self.states,
+                                    np.hstack((locs[new], np.zeros((len(new), 3))))))
+      self.covs = np.concatenate((self.covs, cov))
+      self.ids = np.concatenate((self.ids,
+                                 np.arange(self.next_id, self.next_id + len(new))))
+      self.hits = np.concatenate((self.hits, np.ones(len(new), dtype=np.int64)))
+      self.misses = np.concatenate((self.misses, np.zeros(len(new), dtype=np.int64)))
+      self.next_id += len(new)
+
+  '''[confidence]--------------------------------------------------------------
+    Confidence of every track in [0, 1]. Grows with the number of pings a
+    track was seen on and decays with every ping it is missed.
+  --------------------------------------------------------------------------'''
+  def confidence(self):
+    return (1 - np.exp(-self.hits / KF_CONFIRM_HITS)) * KF_MISS_DECAY ** self.misses
@@ -0,0 +1,81 @@
+'''*-----------------------------------------------------------------------*---
+                                                          Date  : Oct 18 2026
+
+    File Name  : test_sonar_processor.py
+    Description: Checks that the batched and vectorized solver paths give the
+                 same results as the scalar code they replace.
+
+                 python3 -m pytest
+---*-----------------------------------------------------------------------*'''
+
+import itertools
+
+import numpy as np
+
+import sensor_array
+import sonar_processor
+
+'''----------------------------------------------------------------------------
+Config variables
+----------------------------------------------------------------------------'''
+SEED = 0
+NUM_OBJS = 40
+
+'''[random_locs]---------------------------------------------------------------
+  Places num objects in the same volume as gen_times
+----------------------------------------------------------------------------'''
+def random_locs(rng, num):
+  return np.column_stack((rng.uniform(-50, 50, num), rng.uniform(0, 100, num),
+                          rng.uniform(-25, 25, num)))
+
+def make_sensors():
+  return sensor_array.sensor_array.from_locs(sonar_processor.SENSOR_LOCS,
+                                             sonar_processor.SAMPLE_RATE)
+
+'''[test_resolve_t_arrays_matches_scalar]--------------------------------------
+  The batch solver agrees with resolve_t_array on sampled times of real
+  objects and on mismatched sets that should mostly fail
+----------------------------------------------------------------------------'''
+def test_resolve_t_arrays_matches_scalar():
+  rng = np.random.default_rng(SEED)
+  sensors = make_sensors()
+
+  times = sensors.calc_times(random_locs(rng, NUM_OBJS), False)
+  mixed = np.column_stack([rng.permutation(times[:, r]) for r in range(4)])
+  cand_times = np.concatenate((times, mixed))
+
+  success, locs = sonar_processor.resolve_t_arrays(cand_times, sensors,
+                                                   sonar_processor.TOL_INT)
+
+  for c, t in enumerate(cand_times):
+    ok, loc = sonar_processor.resolve_t_array(*t, sensors,
+                                              sonar_processor.TOL_INT, False)
+    assert bool(ok) == bool(success[c])
+    if ok:
+      np.testing.assert_allclose(locs[c], loc, atol=1e-6)
+
+  assert success[:NUM_OBJS].mean() > 0.5
+
+'''[test_gen_candidates_matches_brute_force]-----------------------------------
+  The windowed candidate search finds exactly the sets of times whose every
+  pair is within its baseline
+----------------------------------------------------------------------------'''
+def test_gen_candidates_matches_brute_force():
+  rng = np.random.default_rng(SEED)
+  sensors = make_sensors()
+  slack = 1 / sensors.sample_rate
+
+  times = sensors.calc_times(random_locs(rng, 12), False)
+  times = [list(times[:, r]) for r in range(4)]
+
+  cands, sorted_times = sonar_processor.gen_candidates(times, sensors, slack)
+  found = {tuple(sorted_times[r][c[r]] for r in range(4)) for c in cands}
+
+  max_dt = sensors.max_dt + slack
+  expected = set()
+  for combo in itertools.product(*times):
+    if all(abs(combo[q] - combo[r]) <= max_dt[q][r]
+           for q in range(4) for r in range(4)):
+      expected.add(combo)
+
+  assert found == expected
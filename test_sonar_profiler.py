@@ -0,0 +1,102 @@
+'''*-----------------------------------------------------------------------*---
+                                                          Date  : Oct 18 2026
+
+    File Name  : test_sonar_profiler.py
+    Description: Checks that the streaming stages give the same output fed in
+                 chunks as fed a whole ping at once.
+
+                 python3 -m pytest
+---*-----------------------------------------------------------------------*'''
+
+import numpy as np
+import pytest
+
+import sonar_profiler
+
+'''----------------------------------------------------------------------------
+Config variables
+----------------------------------------------------------------------------'''
+SEED = 0
+SAMPLE_RATE = 200000
+LENGTH = 20000
+CHUNKS = [LENGTH, 4096, 1000, 7]
+
+'''[echo_samples]--------------------------------------------------------------
+  Builds channels of short pulses at random positions, with some pulses
+  placed on the first sample of a chunk
+----------------------------------------------------------------------------'''
+def echo_samples(rng, channels=4):
+  samples = np.zeros((channels, LENGTH))
+  pulse = np.hanning(9)[1:-1]
+
+  for rcvr in range(channels):
+    for start in rng.integers(10, LENGTH - 10, 20):
+      samples[rcvr, start:start + len(pulse)] += pulse * rng.uniform(1, 3)
+    samples[rcvr, 4095:4098] = [0.2, 3, 0.2]
+
+  return samples
+
+'''[profile_chunked]-----------------------------------------------------------
+  Profiles samples fed in chunks of chunk samples
+----------------------------------------------------------------------------'''
+def profile_chunked(samples, chunk, peak_window):
+  pf = sonar_profiler.sonar_profiler(SAMPLE_RATE, 0.5, 10, len(samples), peak_window)
+  peaks = [[] for rcvr in range(len(samples))]
+
+  for start in range(0, samples.shape[1], chunk):
+    for rcvr, found in enumerate(pf.process(samples[:, start:start + chunk])):
+      peaks[rcvr].extend(found)
+  for rcvr, found in enumerate(pf.flush()):
+    peaks[rcvr].extend(found)
+
+  return [np.array(p) for p in peaks]
+
+'''[test_profiler_chunk_invariant]---------------------------------------------
+  Crossing and peak window timing do not depend on chunk boundaries
+----------------------------------------------------------------------------'''
+@pytest.mark.parametrize('peak_window', [0, 8])
+def test_profiler_chunk_invariant(peak_window):
+  samples = echo_samples(np.random.default_rng(SEED))
+  whole = profile_chunked(samples, LENGTH, peak_window)
+
+  for chunk in CHUNKS[1:]:
+    for a, b in zip(whole, profile_chunked(samples, chunk, peak_window)):
+      assert len(a) == len(b)
+      np.testing.assert_allclose(a, b, rtol=0, atol=1e-9 / SAMPLE_RATE)
+
+'''[test_matched_chunk_invariant]----------------------------------------------
+  The matched filter gives the same envelope in chunks, and flush returns
+  the echo at the very end of a stream
+----------------------------------------------------------------------------'''
+def test_matched_chunk_invariant():
+  rng = np.random.default_rng(SEED)
+  template = sonar_profiler.ping_template(SAMPLE_RATE, 40000, 0.0004)
+  samples = rng.standard_normal((2, LENGTH)) * 0.1
+  samples[:, -len(template):] += template
+
+  def run(chunk):
+    mf = sonar_profiler.sonar_matched(template, 256, 2)
+    parts = [mf.process(samples[:, s:s + chunk]) for s in range(0, LENGTH, chunk)]
+    return np.concatenate(parts + [mf.flush()], axis=1)
+
+  whole = run(LENGTH)
+  for chunk in CHUNKS[1:]:
+    np.testing.assert_allclose(run(chunk), whole, atol=1e-9)
+
+  delay = len(template) - 1
+  found = np.argmax(whole, axis=1) - delay
+  assert np.all(np.abs(found - (LENGTH - len(template))) <= 1)
+
+'''[test_envelope_chunk_invariant]---------------------------------------------
+  power and rms envelopes do not depend on chunk boundaries
+----------------------------------------------------------------------------'''
+@pytest.mark.parametrize('mode', ['power', 'rms'])
+def test_envelope_chunk_invariant(mode):
+  samples = np.random.default_rng(SEED).standard_normal((4, LENGTH))
+  whole = sonar_profiler.sonar_envelope(mode).process(samples.copy())
+
+  for chunk in CHUNKS[1:]:
+    env = sonar_profiler.sonar_envelope(mode)
+    parts = [env.process(samples[:, s:s + chunk].copy()).copy()
+             for s in range(0, LENGTH, chunk)]
+    np.testing.assert_allclose(np.concatenate(parts, axis=1), whole, atol=1e-9)
@@ -0,0 +1,194 @@
+'''*-----------------------------------------------------------------------*---
+                                                          Date  : Oct 18 2026
+
+    File Name  : time_grid.py
+    Description: Precomputed table of receiver times over the working volume
+                 for one sensor configuration. Sets of times are located by a
+                 nearest neighbour lookup in the table followed by a few
+                 Gauss-Newton refinement iterations, which gives a bounded
+                 cost per candidate and rejects infeasible sets early.
+---*-----------------------------------------------------------------------*'''
+
+import hashlib
+import math
+import os
+
+import numpy as np
+
+import sensor_array
+
+'''----------------------------------------------------------------------------
+Config variables
+----------------------------------------------------------------------------'''
+GRID_BOUNDS = ((-50, 50), (0, 100), (-25, 25))
+GRID_STEP = 1.0             #grid spacing, in m
+#directory grids are saved in, outside the source tree as each is tens of MB
+GRID_CACHE = os.environ.get('SONAR_GRID_CACHE',
+                            os.path.join(os.path.expanduser('~'), '.cache',
+                                         'sonar', 'time_grid'))
+LEAF_SIZE = 32              #table entries checked per lookup
+REFINE_ITERS = 4
+
+
+'''[time_grid]-----------------------------------------------------------------
+  Grid of locations and their exact receiver times, indexed by a KD-tree over
+  the time vectors. The tree is balanced and stored implicitly: node i splits
+  on dims[i] at vals[i] and has children 2i + 1 and 2i + 2, and every leaf is
+  a row of leaves holding LEAF_SIZE table indices.
+----------------------------------------------------------------------------'''
+class time_grid():
+  '''[__init__]----------------------------------------------------------------
+    Wraps the arrays of a built or loaded grid
+  --------------------------------------------------------------------------'''
+  def __init__(self, rcvr_locs, locs, feats, dims, vals, leaves):
+    self.rcvr_locs = rcvr_locs
+    self.basis = feature_basis(len(rcvr_locs))
+    self.locs = locs
+    self.feats = feats
+    self.dims = dims
+    self.vals = vals
+    self.leaves = leaves
+    self.depth = int(round(math.log2(len(leaves))))
+
+  '''[features]----------------------------------------------------------------
+    Turns (N, S) times into the tree's feature space, in m
+  --------------------------------------------------------------------------'''
+  def features(self, times):
+    times = np.asarray(times, dtype=float).reshape(-1, len(self.basis))
+    return (times * sensor_array.SPEED_WAVE) @ self.basis.T
+
+  '''[build]-------------------------------------------------------------------
+    Calculates times for every grid location and builds the tree.
+
+    sensors - sensor array the grid is for
+    bounds  - (low, high) of the working volume on each axis
+    step    - grid spacing
+  --------------------------------------------------------------------------'''
+  @classmethod
+  def build(cls, sensors, bounds=GRID_BOUNDS, step=GRID_STEP):
+    axes = [np.arange(low, high + step / 2, step) for low, high in bounds]
+    locs = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+    times = sensors.calc_times(locs, True)
+    feats = (times * sensor_array.SPEED_WAVE) @ feature_basis(len(sensors)).T
+
+    depth = max(0, int(math.ceil(math.log2(len(locs) / LEAF_SIZE))))
+    order = np.arange(len(locs))
+    dims = np.zeros(2 ** depth - 1, dtype=np.int64)
+    vals = np.zeros(2 ** depth - 1)
+    leaves = np.zeros((2 ** depth, LEAF_SIZE), dtype=np.int64)
+
+    #split on the dim with the largest spread, at the median
+    stack = [(0, 0, len(locs), 0)]
+    while stack:
+      node, low, high, level = stack.pop()
+
+      if level == depth:
+        leaf = order[low:high]
+        leaves[node - len(dims)] = np.resize(leaf, LEAF_SIZE) if len(leaf) else 0
+        continue
+
+      pts = feats[order[low:high]]
+      dim = np.argmax(pts.max(axis=0) - pts.min(axis=0)) if len(pts) else 0
+      mid = (low + high) // 2
+
+      if high > low:
+        part = np.argpartition(pts[:, dim], min(mid - low, high - low - 1))
+        order[low:high] = order[low:high][part]
+        vals[node] = feats[order[min(mid, high - 1)], dim]
+      dims[node] = dim
+
+      stack.append((2 * node + 1, low, mid, level + 1))
+      stack.append((2 * node + 2, mid, high, level + 1))
+
+    return cls(sensors.locs.copy(), locs, feats, dims, vals, leaves)
+
+  '''[save]--------------------------------------------------------------------
+    Saves grid to an .npz file
+  --------------------------------------------------------------------------'''
+  def save(self, path):
+    np.savez(path, rcvr_locs=self.rcvr_locs, locs=self.locs, feats=self.feats,
+             dims=self.dims, vals=self.vals, leaves=self.leaves)
+
+  '''[load]--------------------------------------------------------------------
+    Loads grid from an .npz file
+  --------------------------------------------------------------------------'''
+  @classmethod
+  def load(cls, path):
+    with np.load(path) as data:
+      return cls(data['rcvr_locs'], data['locs'], data['feats'], data['dims'],
+                 data['vals'], data['leaves'])
+
+  '''[lookup]------------------------------------------------------------------
+    Finds the grid location whose times are closest to each set of times.
+    All queries descend the tree together and search only the leaf they land
+    in, so the result is approximate but the cost per query is fixed.
+
+    times    - (N, S) array of receiver times
+    [return] - (N, 3) array of grid locations, (N,) time distances in s
+  --------------------------------------------------------------------------'''
+  def lookup(self, times):
+    query = self.features(times)
+    rows = np.arange(len(query))
+    node = np.zeros(len(query), dtype=np.int64)
+
+    for level in range(self.depth):
+      right = query[rows, self.dims[node]] >= self.vals[node]
+      node = 2 * node + 1 + right
+
+    cands = self.leaves[node - len(self.dims)]
+    dist = ((self.feats[cands] - query[:, None]) ** 2).sum(axis=2)
+    best = cands[rows, np.argmin(dist, axis=1)]
+
+    return self.locs[best], np.sqrt(dist.min(axis=1)) / sensor_array.SPEED_WAVE
+
+  '''[resolve]-----------------------------------------------------------------
+    Solves sets of receiver times by lookup and refinement, like
+    resolve_t_arrays.
+
+    times    - (N, S) array of receiver times
+    tol      - largest root sum square time residual of a solution, in s
+    [return] - (N,) mask of successful resolutions, (N, 3) array of locations
+  --------------------------------------------------------------------------'''
+  def resolve(self, times, tol, iters=REFINE_ITERS):
+    times = np.asarray(times, dtype=float).reshape(-1, len(self.basis))
+    locs, dist = self.lookup(times)
+
+    with np.errstate(invalid='ignore', over='ignore'):
+      locs = sensor_array.refine_locs(locs, times, self.rcvr_locs, iters)
+      pred = sensor_array.calc_time_matrix(locs, self.rcvr_locs, 1, True)
+      res = np.sqrt(((pred - times) ** 2).sum(axis=1))
+
+    return res <= tol, locs
+
+'''[feature_basis]-------------------------------------------------------------
+  Orthonormal basis for time vectors of num receivers. It keeps distances
+  but puts the range shared by all receivers on the first axis, apart from
+  the small differences between receivers.
+----------------------------------------------------------------------------'''
+def feature_basis(num):
+  seed = np.eye(num)
+  seed[:, 0] = 1
+  q, r = np.linalg.qr(seed)
+  return q.T
+
+'''[grid_path]-----------------------------------------------------------------
+  Gets the cache file name for a sensor configuration and grid layout
+----------------------------------------------------------------------------'''
+def grid_path(sensors, bounds, step, cache_dir):
+  key = repr((sensors.locs.tolist(), bounds, step, LEAF_SIZE)).encode()
+  return os.path.join(cache_dir, 'time_grid_' + hashlib.sha1(key).hexdigest()[:12] + '.npz')
+
+'''[load_or_build]-------------------------------------------------------------
+  Loads the grid for a sensor configuration from cache_dir, building and
+  saving it first if it does not exist yet.
+----------------------------------------------------------------------------'''
+def load_or_build(sensors, bounds=GRID_BOUNDS, step=GRID_STEP, cache_dir=GRID_CACHE):
+  path = grid_path(sensors, bounds, step, cache_dir)
+
+  if os.path.exists(path):
+    return time_grid.load(path)
+
+  grid = time_grid.build(sensors, bounds, step)
+  os.makedirs(cache_dir, exist_ok=True)
+  grid.save(path)
+  return grid
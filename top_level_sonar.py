@@ -12,37 +12,42 @@
                          
 ---*-----------------------------------------------------------------------*'''
 
+import sensor_array
 import sonar_processor
+import dsm_shm
+import importlib
 import sys
-import time
 '''----------------------------------------------------------------------------
 Config variables
 ----------------------------------------------------------------------------'''
 USE_DSM = True
+DSM_PATHS = ['./DistributedSharedMemory/build', './PythonSharedBuffers/src']
 CLIENT_SERV = 42
 CLIENT_ID = 0
 
-HYDROPHONE_POS = [[0] * 2] * 4
+#x, y, z of every hydrophone in m, with the emitter at the origin. Any layout
+#of 4 or more works, the T layout below can also use the ellipse solver.
+HYDROPHONE_POS = [[0,     0, 0],
+                  [-0.15, 0, 0],
+                  [0.25,  0, 0],
+                  [0,     0, 0.2]]
+SAMPLE_RATE = 200000
 
-HYDROPHONE_POS[0][0] = 0
-HYDROPHONE_POS[0][1] = 0
+'''[load_dsm]------------------------------------------------------------------
+  Imports the pydsm bindings from DSM_PATHS, falling back to the shared
+  memory stand-in when they are not built
 
-HYDROPHONE_POS[1][0] = -0.15
-HYDROPHONE_POS[1][1] = 0
-
-HYDROPHONE_POS[2][0] = 0.25
-HYDROPHONE_POS[2][1] = 0
-
-HYDROPHONE_POS[3][0] = 0
-HYDROPHONE_POS[3][1] = 0.2
-
-'''----------------------------------------------------------------------------
-Conditional imports
+  [return] - module with a pydsm compatible Client
 ----------------------------------------------------------------------------'''
-if USE_DSM:
-  sys.path.insert(0, './DistributedSharedMemory/build')
-  sys.path.insert(0, './PythonSharedBuffers/src')
-  import pydsm
+def load_dsm():
+  for path in DSM_PATHS:
+    if path not in sys.path:
+      sys.path.insert(0, path)
+  try:
+    return importlib.import_module('pydsm')
+  except ImportError:
+    print('[main] pydsm not available, using shared memory stand-in')
+    return dsm_shm
 
 '''[main]----------------------------------------------------------------------
   Initializes profiler, processor, and DSMClient. Then monitors status of the
@@ -52,17 +57,27 @@ def main():
   try:
 
     print('[main] Initializing model')
-    #model = model(HYDROPHONE_POS)
+    sensors = sensor_array.sensor_array.from_locs(HYDROPHONE_POS, SAMPLE_RATE)
+    solver = 'ellipse' if sensors.tshape else 'lsq'
     print('[main] Initializing threads')
     #start profiler
     #pf = sonar_profiler()
 
-    #start processor
-    s_p = sonar_processor.sonar_processor()
+    #start processor, a replayed capture is read faster than it is solved,
+    #so wait for room in the queue instead of dropping pings
+    s_p = sonar_processor.sonar_processor(tracking=True, solver=solver,
+                                          sensors=sensors, queue_policy='block')
+
+    ping_locs = []
+    s_p.on_ping = lambda ping, locs: ping_locs.append((ping, locs))
 
-    print('[main] Starting DSM')
-    #begin interfacing with DSM
-    client = pydsm.Client(CLIENT_SERV, CLIENT_ID, True)
+    if USE_DSM:
+      print('[main] Starting DSM')
+      #begin interfacing with DSM
+      client = load_dsm().Client(CLIENT_SERV, CLIENT_ID, True)
+      client.registerLocalBuffer(sonar_processor.RESULTS_BUFFER,
+                                 s_p.get_results().nbytes, False)
+      s_p.client = client
 
     print('[main] Starting threads')
     #pf.start()
@@ -72,14 +87,21 @@ def main():
     #for i in range(len(bufNames)):
     #  client.registerRemoteBuffer(bufNames[i], bufIps[i], int(bufIds[i]))
     
-    for i in range(100):
-      s_p.callback('GO')
+    #hand each ping of the capture to the processor as soon as it is read
+    samples = sonar_processor.read_samples(sonar_processor.DATA_FILE, len(sensors),
+                                             sensors.sample_rate)
+    ping_len = int(s_p.sensors.sample_rate * sonar_processor.PING_PERIOD)
 
-      print(str(s_p.found_locs))
+    for start in range(0, len(samples[0]), ping_len):
+      s_p.callback('GO', [rcvr[start:start + ping_len] for rcvr in samples],
+                   start / s_p.sensors.sample_rate)
 
-      time.sleep(0.5)
+    s_p.drain()
+    for ping, locs in ping_locs:
+      print('[main] Ping ' + str(ping) + ': ' + str(locs))
 
-    pc.join()
+    s_p.callback('END')
+    s_p.join()
   except KeyboardInterrupt:
     print('\n[main] Ctrl+c received. Ending program')
 